@@ -0,0 +1,249 @@
+import asyncio
+import hashlib
+import json
+import os
+
+from langchain_core.messages import convert_to_openai_messages
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from own_framework import AGENT_PROMPTS, ERROR_KEYS, get_llm
+from aggregation import aggregate_mt_quality
+from dry_run import STAGE1_KEYS, STAGE3_KEYS
+from packing import pack_messages, packed_schema, unpack_outputs, segment_length
+
+
+# Each stage only needs the outputs of the stages before it, so a stage's requests for every
+# row go out together and the next stage starts once they are all back.
+BATCH_STAGES = [STAGE1_KEYS, ERROR_KEYS, STAGE3_KEYS, ["cross_reasoning"]]
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_MAX_REQUESTS = 50_000
+BATCH_MAX_BYTES = 190 * 1024 * 1024
+FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+class OpenAIBatchClient:
+    """Thin wrapper over the OpenAI Files + Batches endpoints."""
+
+    def __init__(self, client=None, completion_window="24h"):
+        if client is None:
+            from openai import OpenAI
+            client = OpenAI()
+        self.client = client
+        self.completion_window = completion_window
+
+    def submit(self, path):
+        with open(path, "rb") as f:
+            input_file = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=input_file.id, endpoint=BATCH_ENDPOINT, completion_window=self.completion_window,
+        )
+        return batch.id
+
+    def retrieve(self, batch_id):
+        batch = self.client.batches.retrieve(batch_id)
+        return {
+            "id": batch.id,
+            "status": batch.status,
+            "output_file_id": batch.output_file_id,
+            "error_file_id": batch.error_file_id,
+        }
+
+    def content(self, file_id):
+        return self.client.files.content(file_id).text
+
+
+def request_line(custom_id, messages, schema):
+    """One Batch-API request: the same forced function call run_chain makes for these messages."""
+    tool = convert_to_openai_tool(schema)
+    llm = get_llm()
+    body = {
+        "model": llm.model_name,
+        "temperature": llm.temperature,
+        "messages": convert_to_openai_messages(messages),
+        "tools": [tool],
+        "tool_choice": {"type": "function", "function": {"name": tool["function"]["name"]}},
+        "parallel_tool_calls": False,
+    }
+    return {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body}
+
+
+def parse_line(line, schema_for):
+    """(custom_id, parsed output or None, error message or None) for one line of a batch output/error file."""
+    record = json.loads(line)
+    custom_id = record["custom_id"]
+    response = record.get("response") or {}
+    if record.get("error") or response.get("status_code") != 200:
+        return custom_id, None, str(record.get("error") or response.get("body"))
+    try:
+        call = response["body"]["choices"][0]["message"]["tool_calls"][0]
+        return custom_id, schema_for(custom_id).model_validate_json(call["function"]["arguments"]), None
+    except Exception as e:
+        return custom_id, None, f"{type(e).__name__}: {e}"
+
+
+def write_request_files(lines, prefix):
+    """Split request lines into JSONL files within the per-batch request and size limits."""
+    paths = []
+    f = None
+    count = size = 0
+    for line in lines:
+        data = json.dumps(line, ensure_ascii=False) + "\n"
+        if f is None or count >= BATCH_MAX_REQUESTS or size + len(data.encode("utf-8")) > BATCH_MAX_BYTES:
+            if f is not None:
+                f.close()
+            paths.append(f"{prefix}-{len(paths)}.jsonl")
+            f = open(paths[-1], "w", encoding="utf-8")
+            count = size = 0
+        f.write(data)
+        count += 1
+        size += len(data.encode("utf-8"))
+    if f is not None:
+        f.close()
+    return paths
+
+
+class BatchRun:
+    """
+    Drives the full pipeline through a batch client stage by stage for a set of row states.
+    Submitted batch ids are recorded in workdir/manifest.json with a fingerprint of the exact
+    request lines, so a restarted run picks up the batches it already submitted instead of paying
+    for them again, and only when it would send the very same requests. Requests that fail are
+    resubmitted in a further round, up to max_rounds per stage; rows still missing an output
+    after that are dropped from later stages and reported as failed.
+
+    With pack_size > 1 the first round of every stage packs pack_size triples per request
+    (sorted by length so packs are even); segments of a pack whose answer does not unpack
+    cleanly are retried as single requests in the next round.
+    """
+
+    def __init__(self, client, workdir, poll_interval=60.0, max_rounds=3, pack_size=1, log=print):
+        self.client = client
+        self.pack_size = pack_size
+        self.workdir = workdir
+        self.poll_interval = poll_interval
+        self.max_rounds = max_rounds
+        self.log = log
+        os.makedirs(workdir, exist_ok=True)
+        self.manifest_path = os.path.join(workdir, "manifest.json")
+        self.manifest = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding="utf-8") as f:
+                self.manifest = json.load(f)
+
+    def _save_manifest(self):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    async def _submit(self, name, lines):
+        # the full request bodies, so a prompt, model or schema change never reuses old batches
+        fingerprint = hashlib.sha256(
+            "\n".join(json.dumps(line, ensure_ascii=False, sort_keys=True) for line in lines).encode("utf-8")
+        ).hexdigest()
+        entry = self.manifest.get(name)
+        if entry is not None and entry["requests"] == fingerprint:
+            self.log(f"[batch] {name}: reusing {len(entry['batch_ids'])} submitted batches")
+            return entry["batch_ids"]
+        paths = write_request_files(lines, os.path.join(self.workdir, name))
+        batch_ids = [await asyncio.to_thread(self.client.submit, path) for path in paths]
+        self.manifest[name] = {"requests": fingerprint, "batch_ids": batch_ids}
+        self._save_manifest()
+        self.log(f"[batch] {name}: submitted {len(lines)} requests as {len(batch_ids)} batches")
+        return batch_ids
+
+    async def _collect(self, batch_ids):
+        pending = list(batch_ids)
+        batches = []
+        while pending:
+            for batch_id in list(pending):
+                batch = await asyncio.to_thread(self.client.retrieve, batch_id)
+                if batch["status"] in FINAL_STATUSES:
+                    pending.remove(batch_id)
+                    batches.append(batch)
+            if pending:
+                self.log(f"[batch] waiting on {len(pending)} batches")
+                await asyncio.sleep(self.poll_interval)
+
+        lines = []
+        for batch in batches:
+            if batch["status"] != "completed":
+                self.log(f"[batch] {batch['id']} ended {batch['status']}")
+            for file_id in (batch.get("output_file_id"), batch.get("error_file_id")):
+                if file_id:
+                    text = await asyncio.to_thread(self.client.content, file_id)
+                    lines.extend(line for line in text.splitlines() if line.strip())
+        return lines
+
+    def _requests(self, todo, states, pack):
+        """Request lines for the (key, node) pairs in todo, and custom_id -> [(key, node)] they cover."""
+        lines = []
+        covers = {}
+        if pack:
+            for node in sorted({node for _, node in todo}):
+                prompt_template, schema, build_inputs = AGENT_PROMPTS[node]
+                keys = sorted((key for key, n in todo if n == node), key=lambda k: (segment_length(states[k]), k))
+                for start in range(0, len(keys), self.pack_size):
+                    chunk = keys[start:start + self.pack_size]
+                    # named after its rows, so a pack id never stands for different content
+                    digest = hashlib.sha256("\n".join(chunk).encode("utf-8")).hexdigest()[:16]
+                    custom_id = f"pack|{node}|{digest}"
+                    messages = pack_messages(prompt_template, [build_inputs(states[key]) for key in chunk])
+                    lines.append(request_line(custom_id, messages, packed_schema(schema)))
+                    covers[custom_id] = [(key, node) for key in chunk]
+            return lines, covers
+
+        for key, node in sorted(todo):
+            prompt_template, schema, build_inputs = AGENT_PROMPTS[node]
+            custom_id = f"{key}|{node}"
+            lines.append(request_line(custom_id, prompt_template.format_messages(**build_inputs(states[key])), schema))
+            covers[custom_id] = [(key, node)]
+        return lines, covers
+
+    async def run_stage(self, index, nodes, states, errors):
+        todo = {(key, node) for key in states for node in nodes}
+        for round_index in range(self.max_rounds):
+            if not todo:
+                break
+            pack = self.pack_size > 1 and round_index == 0
+            lines, covers = self._requests(todo, states, pack)
+
+            def schema_for(custom_id):
+                schema = AGENT_PROMPTS[covers[custom_id][0][1]][1]
+                return packed_schema(schema) if custom_id.startswith("pack|") else schema
+
+            batch_ids = await self._submit(f"stage-{index}-round-{round_index}", lines)
+            for line in await self._collect(batch_ids):
+                custom_id, output, error = parse_line(line, schema_for)
+                pairs = covers.get(custom_id)
+                if not pairs or not any(pair in todo for pair in pairs):
+                    continue
+                outputs = None
+                if output is not None and custom_id.startswith("pack|"):
+                    outputs = unpack_outputs(output, AGENT_PROMPTS[pairs[0][1]][1], len(pairs))
+                    error = "packed answer did not match its segments"
+                elif output is not None:
+                    outputs = [output]
+                if outputs is None:
+                    for key, node in pairs:
+                        errors[key] = f"{node}: {error}"
+                    continue
+                for (key, node), value in zip(pairs, outputs):
+                    states[key][node] = value
+                    todo.discard((key, node))
+            if todo:
+                self.log(f"[batch] stage {index}: {len(todo)} requests without output after round {round_index}")
+
+        for key in {key for key, _ in todo}:
+            errors.setdefault(key, "no output returned")
+            del states[key]
+
+    async def run(self, states):
+        """Evaluate {key: initial MTState}; returns ({key: final state}, {key: error})."""
+        states = dict(states)
+        errors = {}
+        for index, nodes in enumerate(BATCH_STAGES):
+            await self.run_stage(index, nodes, states, errors)
+        for state in states.values():
+            state.update(aggregate_mt_quality(state))
+        return states, {key: error for key, error in errors.items() if key not in states}
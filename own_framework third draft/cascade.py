@@ -0,0 +1,96 @@
+from collections import defaultdict
+
+from chain_runner import invoke_structured
+from model_backends import model_label
+from retry_policy import DEFAULT_RETRY_POLICY
+
+
+# (probability field, confidence field) pairs an output can be gated on; confidences are 0-100.
+GATE_FIELDS = [
+    ("probability", "confidence"),
+    ("reEvaluatedProb", "reEvaluatedConfidence"),
+    (None, "consistencyScore"),
+]
+
+
+def gate_signals(output):
+    """(probability or None, confidence or None) for every verdict in an output, including fused/express verdict lists."""
+    signals = []
+    for probability_field, confidence_field in GATE_FIELDS:
+        if hasattr(output, confidence_field):
+            probability = getattr(output, probability_field) if probability_field else None
+            signals.append((probability, getattr(output, confidence_field)))
+    for verdict in getattr(output, "verdicts", None) or []:
+        signals.extend(gate_signals(verdict))
+    return signals
+
+
+def is_gated(schema):
+    fields = schema.model_fields
+    return "verdicts" in fields or any(confidence in fields for _, confidence in GATE_FIELDS)
+
+
+class ModelCascade:
+    """
+    Runs every agent on a cheap model first and re-runs it on the main model only when the cheap
+    answer is uncertain: a probability inside `band` (low, high) or a confidence below
+    `min_confidence`. Outputs with no probability or confidence to gate on (cross-reasoning) go
+    straight to the main model, as do cheap answers that fail to parse. Per-node counts are kept
+    for report().
+    """
+
+    def __init__(self, cheap_llm, llm_factory, band=(0.2, 0.8), min_confidence=60.0):
+        self.cheap_llm = cheap_llm
+        self.cheap_label = model_label(cheap_llm)
+        self.llm_factory = llm_factory
+        self.band = band
+        self.min_confidence = min_confidence
+        self.cheap_calls = defaultdict(int)
+        self.escalated = defaultdict(int)
+        self.direct = defaultdict(int)
+        self._llms = {}
+
+    def _cheap(self, schema):
+        if schema not in self._llms:
+            self._llms[schema] = self.llm_factory(self.cheap_llm, schema)
+        return self._llms[schema]
+
+    def uncertain(self, output):
+        low, high = self.band
+        for probability, confidence in gate_signals(output):
+            if probability is not None and low < probability < high:
+                return True
+            if confidence is not None and confidence < self.min_confidence:
+                return True
+        return False
+
+    async def run(self, messages, structured_llm, node, schema, model):
+        if not is_gated(schema):
+            self.direct[node] += 1
+            return await invoke_structured(messages, structured_llm, node, schema, model)
+
+        self.cheap_calls[node] += 1
+        try:
+            output = await invoke_structured(messages, self._cheap(schema), node, schema, self.cheap_label)
+        except Exception as e:
+            if DEFAULT_RETRY_POLICY.is_transient(e):
+                raise
+            output = None
+
+        if output is not None and not self.uncertain(output):
+            return output
+        self.escalated[node] += 1
+        return await invoke_structured(messages, structured_llm, node, schema, model)
+
+    def report(self):
+        """{node: {cheap_calls, escalated, escalation_rate, direct}} for every node the cascade saw."""
+        nodes = sorted(set(self.cheap_calls) | set(self.direct))
+        return {
+            node: {
+                "cheap_calls": self.cheap_calls[node],
+                "escalated": self.escalated[node],
+                "escalation_rate": self.escalated[node] / self.cheap_calls[node] if self.cheap_calls[node] else None,
+                "direct": self.direct[node],
+            }
+            for node in nodes
+        }
@@ -0,0 +1,93 @@
+import asyncio
+import time
+
+from rate_limiter import limiter
+from retry_policy import DEFAULT_RETRY_POLICY
+from row_executor import backoff_sleep, report_outcome
+from response_cache import response_cache, cache_key
+from progress import run_stats
+from token_counter import count_message_tokens
+from cost_ledger import ledger
+
+
+# Reserved per call before the real completion size is known; settled against usage afterwards.
+EXPECTED_COMPLETION_TOKENS = 300
+
+
+def usage_of(raw):
+    usage = getattr(raw, "usage_metadata", None)
+    return dict(usage) if usage else None
+
+
+# Set to a packing.SegmentPacker to evaluate several rows per call (see the driver's --pack).
+packer = None
+# Set to a cascade.ModelCascade to try a cheap model first (see the driver's --cascade).
+cascade = None
+# Set to a hedging.RequestHedger to duplicate slow calls (see the driver's --hedge).
+hedger = None
+
+
+async def run_chain(prompt_template, structured_llm, inputs, node, schema, model):
+    """
+    Render prompt_template with inputs and call structured_llm (built with include_raw=True).
+    Returns the parsed pydantic output (a schema instance). With a packer configured the call
+    may be combined with the same node's calls for other rows; with a cascade it may be answered
+    by the cheap model.
+    """
+    if packer is not None:
+        return await packer.run(node, prompt_template, schema, model, inputs)
+    if cascade is not None:
+        return await cascade.run(prompt_template.format_messages(**inputs), structured_llm, node, schema, model)
+    return await invoke_structured(prompt_template.format_messages(**inputs), structured_llm, node, schema, model)
+
+
+async def invoke_structured(messages, structured_llm, node, schema, model, policy=DEFAULT_RETRY_POLICY):
+    """
+    Call structured_llm on messages through the shared rate limiter. Outputs are served from and
+    stored in the persistent response cache when it is enabled; usage goes to the cost ledger.
+    Transient API errors are retried here, per call, under `policy` (the clients are built with
+    max_retries=0): every attempt goes through the limiter, and every 429/timeout reaches the
+    adaptive controller as it happens.
+    """
+    key = None
+    if response_cache is not None:
+        key = cache_key(model, messages, schema)
+        cached = await asyncio.to_thread(response_cache.get, key)
+        if cached is not None:
+            ledger.record_cache_hit(node)
+            return schema.model_validate_json(cached)
+
+    estimated = count_message_tokens(messages) + EXPECTED_COMPLETION_TOKENS
+
+    for attempt in range(1, policy.max_retries + 1):
+        await limiter.acquire(estimated)
+        started = time.monotonic()
+        try:
+            if hedger is not None:
+                out = await hedger.call(structured_llm, messages, node, estimated)
+            else:
+                out = await structured_llm.ainvoke(messages)
+            break
+        except Exception as e:
+            if policy.is_throttle(e):
+                await report_outcome(throttled=True)
+            if attempt == policy.max_retries or not policy.is_transient(e):
+                raise
+            run_stats.record_call_retry()
+            await backoff_sleep(policy.delay_for(attempt, e))
+    run_stats.record_call(node, time.monotonic() - started)
+
+    usage = usage_of(out["raw"])
+    if usage:
+        run_stats.record_usage(node, usage)
+        ledger.record(node, model, usage)
+    limiter.settle(estimated, usage["total_tokens"] if usage else None)
+
+    if out["parsing_error"] is not None:
+        raise out["parsing_error"]
+    if out["parsed"] is None:
+        raise ValueError(f"{node}: model returned no structured output")
+
+    if key is not None:
+        await asyncio.to_thread(response_cache.put, key, model, node, out["parsed"].model_dump_json())
+    return out["parsed"]
@@ -0,0 +1,72 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+import own_framework
+
+
+def compute_prompt_version():
+    """
+    Short fingerprint of everything an agent sends the model besides the row: its prompt template
+    (system and human messages, as laid out by prompt_layout) and its output JSON schema, field
+    descriptions included. Editing any of them invalidates old results.
+    """
+    h = hashlib.sha256()
+    for registry in (own_framework.AGENT_PROMPTS, own_framework.FUSED_STAGE2_PROMPTS, own_framework.EXPRESS_PROMPTS):
+        for node in sorted(registry):
+            prompt_template, schema, _ = registry[node]
+            h.update(json.dumps(
+                {
+                    "node": node,
+                    "messages": [[type(m).__name__, m.prompt.template] for m in prompt_template.messages],
+                    "schema": schema.model_json_schema(),
+                },
+                ensure_ascii=False,
+                sort_keys=True,
+            ).encode("utf-8"))
+    return h.hexdigest()[:12]
+
+
+PROMPT_VERSION = compute_prompt_version()
+
+
+def row_content_hash(source, mt, reference, prompt_version=PROMPT_VERSION):
+    payload = json.dumps([str(source), str(mt), str(reference), prompt_version], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def has_content_hashes(output_path):
+    header = pd.read_csv(output_path, nrows=0, encoding="utf-8-sig").columns
+    return "content_hash" in header
+
+
+def load_completed(output_path):
+    """
+    Index rows already written to a results CSV as
+    {row_id: {"content_hash", "gold_errors", "top5_predicted", "hits"}}.
+    Later lines win, so a row re-evaluated after a prompt change replaces its stale entry.
+    Files written before content hashes were recorded cannot be verified and resume nothing.
+    """
+    if not os.path.exists(output_path):
+        return {}
+
+    if not has_content_hashes(output_path):
+        return {}
+
+    done = pd.read_csv(
+        output_path,
+        usecols=["row_id", "content_hash", "gold_errors", "top5_predicted", "hits"],
+        encoding="utf-8-sig",
+    )
+
+    completed = {}
+    for row_id, content_hash, gold_errors, top5_predicted, hits in done.itertuples(index=False):
+        completed[int(row_id)] = {
+            "content_hash": content_hash,
+            "gold_errors": json.loads(gold_errors),
+            "top5_predicted": json.loads(top5_predicted),
+            "hits": json.loads(hits),
+        }
+    return completed
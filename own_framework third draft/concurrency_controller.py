@@ -0,0 +1,110 @@
+import time
+from collections import deque
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+class AimdController:
+    """
+    Additive-increase / multiplicative-decrease control of how many rows may be in flight.
+
+    After every `limit` successful rows (one "round") the limit grows by `increase` if the
+    p95 latency and the error rate over the recent window look healthy. A throttle signal
+    (429 / rate limit / timeout) cuts it by `decrease`, at most once per `cooldown` seconds
+    (default: one p95 round trip) so that one burst of 429s from in-flight rows counts as
+    a single congestion event.
+
+    Healthy latency means p95 <= latency_target if one is given, otherwise
+    p95 <= latency_slack * the best p95 seen so far.
+    """
+
+    def __init__(self, initial=8, min_limit=1, max_limit=64, increase=1, decrease=0.5,
+                 latency_target=None, latency_slack=1.5, max_error_rate=0.05,
+                 window=100, cooldown=None):
+        self.limit = max(min_limit, min(max_limit, initial))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_target = latency_target
+        self.latency_slack = latency_slack
+        self.max_error_rate = max_error_rate
+        self.cooldown = cooldown
+
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.best_p95 = None
+        self.successes_this_round = 0
+        self.last_decrease = float("-inf")
+        self.increases = 0
+        self.decreases = 0
+        self._slots = None
+
+    def attach(self, slots):
+        self._slots = slots
+        slots.limit = self.limit
+
+    def p95(self):
+        return percentile(self.latencies, 0.95)
+
+    def error_rate(self):
+        if not self.outcomes:
+            return 0.0
+        return sum(1 for ok in self.outcomes if not ok) / len(self.outcomes)
+
+    def _latency_healthy(self, p95):
+        if p95 is None:
+            return True
+        if self.latency_target is not None:
+            return p95 <= self.latency_target
+        if self.best_p95 is None:
+            return True
+        return p95 <= self.latency_slack * self.best_p95
+
+    async def _apply(self, new_limit):
+        new_limit = max(self.min_limit, min(self.max_limit, new_limit))
+        if new_limit == self.limit:
+            return
+        print(f"[aimd] concurrency {self.limit} -> {new_limit} "
+              f"(p95={self.p95() or 0:.2f}s, errors={self.error_rate():.1%})", flush=True)
+        self.limit = new_limit
+        if self._slots is not None:
+            await self._slots.set_limit(new_limit)
+
+    async def on_success(self, latency):
+        self.latencies.append(latency)
+        self.outcomes.append(True)
+        self.successes_this_round += 1
+
+        if len(self.latencies) == self.latencies.maxlen:
+            p95 = self.p95()
+            if self.best_p95 is None or p95 < self.best_p95:
+                self.best_p95 = p95
+
+        if self.successes_this_round < self.limit:
+            return
+        self.successes_this_round = 0
+
+        if self._latency_healthy(self.p95()) and self.error_rate() <= self.max_error_rate:
+            self.increases += 1
+            await self._apply(self.limit + self.increase)
+
+    async def on_error(self):
+        self.outcomes.append(False)
+
+    async def on_throttle(self):
+        self.outcomes.append(False)
+        now = time.monotonic()
+        cooldown = self.cooldown if self.cooldown is not None else (self.p95() or 1.0)
+        if now - self.last_decrease < cooldown:
+            return
+        self.last_decrease = now
+        self.successes_this_round = 0
+        self.decreases += 1
+        await self._apply(int(self.limit * self.decrease))
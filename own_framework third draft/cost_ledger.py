@@ -0,0 +1,136 @@
+import contextvars
+import json
+import os
+import socket
+import time
+from collections import defaultdict
+
+
+# USD per 1M tokens: (prompt, cached prompt, completion). Models not listed (local or fake
+# backends) are counted in tokens and reported as unpriced.
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+}
+
+# Row the current task is evaluating, set by the driver's retry loop; a tuple for calls shared by
+# several rows (packing), whose usage is split evenly between them.
+current_row = contextvars.ContextVar("current_row", default=None)
+
+COUNTERS = ("calls", "cache_hits", "prompt_tokens", "cached_tokens", "completion_tokens", "dollars")
+
+
+def call_cost(model, prompt_tokens, cached_tokens, completion_tokens):
+    """Dollar cost of one call, or None for a model without a price."""
+    if model not in MODEL_PRICES:
+        return None
+    prompt_price, cached_price, completion_price = MODEL_PRICES[model]
+    return ((prompt_tokens - cached_tokens) * prompt_price + cached_tokens * cached_price
+            + completion_tokens * completion_price) / 1e6
+
+
+class CostLedger:
+    """
+    Token usage and dollars of every model call, attributed to node, row and run. Response-cache
+    hits are counted per node at no cost. write() rolls it up into a JSON ledger with nodes ranked
+    by dollars; ledgers of several processes are combined with merge_ledgers().
+    """
+
+    def __init__(self, run_id=None):
+        self.run_id = run_id or f"{time.strftime('%Y%m%dT%H%M%S')}-{socket.gethostname()}-{os.getpid()}"
+        self.nodes = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+        self.rows = defaultdict(lambda: {"prompt_tokens": 0, "completion_tokens": 0, "dollars": 0.0})
+        self.unpriced_models = set()
+
+    def record(self, node, model, usage):
+        prompt = usage.get("input_tokens") or 0
+        cached = min((usage.get("input_token_details") or {}).get("cache_read") or 0, prompt)
+        completion = usage.get("output_tokens") or 0
+        dollars = call_cost(model, prompt, cached, completion)
+        if dollars is None:
+            self.unpriced_models.add(model)
+            dollars = 0.0
+
+        entry = self.nodes[node]
+        entry["calls"] += 1
+        entry["prompt_tokens"] += prompt
+        entry["cached_tokens"] += cached
+        entry["completion_tokens"] += completion
+        entry["dollars"] += dollars
+
+        row = current_row.get()
+        if row is None:
+            return
+        rows = row if isinstance(row, tuple) else (row,)
+        for row_id in rows:
+            totals = self.rows[str(row_id)]
+            totals["prompt_tokens"] += prompt / len(rows)
+            totals["completion_tokens"] += completion / len(rows)
+            totals["dollars"] += dollars / len(rows)
+
+    def record_cache_hit(self, node):
+        self.nodes[node]["cache_hits"] += 1
+
+    def ranking(self):
+        """Nodes by dollars, then prompt tokens, each with its share of the run's dollars."""
+        total = sum(entry["dollars"] for entry in self.nodes.values())
+        ranked = sorted(self.nodes.items(), key=lambda item: (-item[1]["dollars"], -item[1]["prompt_tokens"], item[0]))
+        return [dict(node=node, **entry, share=entry["dollars"] / total if total else 0.0) for node, entry in ranked]
+
+    def totals(self):
+        return {counter: sum(entry[counter] for entry in self.nodes.values()) for counter in COUNTERS}
+
+    def to_dict(self):
+        return {
+            "runs": [self.run_id],
+            "totals": self.totals(),
+            "nodes": self.ranking(),
+            "rows": {row_id: {key: round(value, 6) for key, value in totals.items()}
+                     for row_id, totals in sorted(self.rows.items(), key=lambda item: _row_order(item[0]))},
+            "unpriced_models": sorted(self.unpriced_models),
+            "prices_per_million_tokens": {model: MODEL_PRICES[model] for model in sorted(MODEL_PRICES)},
+        }
+
+    def write(self, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+def _row_order(row_id):
+    return (0, int(row_id), "") if row_id.lstrip("-").isdigit() else (1, 0, row_id)
+
+
+def merge_ledgers(paths, output_path):
+    """Sum the ledgers at paths (shards or workers of one run) into output_path; missing files are skipped."""
+    ledger = CostLedger(run_id="merged")
+    runs = []
+    for path in paths:
+        if not os.path.exists(path):
+            print(f"[merge] no cost ledger at {path}")
+            continue
+        with open(path, encoding="utf-8") as f:
+            part = json.load(f)
+        runs.extend(part["runs"])
+        for entry in part["nodes"]:
+            for counter in COUNTERS:
+                ledger.nodes[entry["node"]][counter] += entry[counter]
+        for row_id, totals in part["rows"].items():
+            for key, value in totals.items():
+                ledger.rows[row_id][key] += value
+        ledger.unpriced_models.update(part["unpriced_models"])
+    data = ledger.to_dict()
+    data["runs"] = runs
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, output_path)
+    print(f"[merge] cost ledger -> {output_path}")
+    return data
+
+
+ledger = CostLedger()
@@ -0,0 +1,61 @@
+import asyncio
+import hashlib
+import json
+import unicodedata
+from collections import OrderedDict
+
+from row_executor import await_unslotted
+
+
+def normalize_text(text):
+    return unicodedata.normalize("NFC", " ".join(str(text).split()))
+
+
+def triple_key(source, mt, reference):
+    payload = json.dumps([normalize_text(source), normalize_text(mt), normalize_text(reference)], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultDeduplicator:
+    """
+    Runs the pipeline once per normalized (source, mt, reference) triple. Rows whose triple is
+    already finished or still in flight share that result instead of calling the graph again.
+    At most max_entries results are remembered (least recently used are dropped). A failed
+    evaluation is forgotten, so a later duplicate tries again. Duplicates give their row slot
+    back while they wait, so the row doing the work can always get one for its retries.
+    """
+
+    def __init__(self, max_entries=200_000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def run(self, key, compute):
+        future = self.entries.get(key)
+        if future is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            # the row computing it may need a slot to retry; waiting here must not hold one
+            return await await_unslotted(asyncio.shield(future))
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self.entries[key] = future
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+        try:
+            result = await compute()
+        except BaseException as e:
+            if self.entries.get(key) is future:
+                del self.entries[key]
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()  # mark retrieved; rows waiting on it still receive the error
+            raise
+
+        future.set_result(result)
+        return result
@@ -0,0 +1,164 @@
+import json
+from collections import defaultdict
+
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from own_framework import (
+    AGENT_PROMPTS, FUSED_STAGE2_PROMPTS, EXPRESS_PROMPTS, AgentOutputStage1, AgentOutputStage2, AgentOutputStage3,
+    CrossReasoningOutput, FusedOutputStage2, ExpressOutput, SubtypeVerdictStage2, ERROR_KEYS,
+)
+from token_counter import count_tokens, count_message_tokens
+
+
+STAGE1_KEYS = ["accuracyStage1", "fluencyStage1", "terminologyStage1", "styleStage1"]
+STAGE3_KEYS = ["accuracyStage3", "fluencyStage3", "terminologyStage3", "styleStage3"]
+
+# Dependent LLM hops on a row's critical path: Stage-1 -> Stage-2 -> Stage-3 -> cross-reasoning
+# (a single hop in express mode).
+CRITICAL_PATH_HOPS = {"full": 4, "fused": 4, "express": 1}
+
+# Typical length (in words) of the free-text fields models fill in; used to size stand-in
+# upstream outputs for later-stage prompts and to estimate completion tokens.
+FREE_TEXT_WORDS = 45
+
+
+def _filler(words=FREE_TEXT_WORDS):
+    return " ".join(["evidence"] * words)
+
+
+def stand_in_outputs(mt):
+    """Representative agent outputs, so Stage-2/3 and cross-reasoning prompts can be rendered without a model."""
+    span_end = min(len(mt), 12)
+    outputs = {}
+    for key in STAGE1_KEYS:
+        outputs[key] = AgentOutputStage1(probability=0.2, reason=_filler(), confidence=80.0)
+    for key in ERROR_KEYS:
+        outputs[key] = AgentOutputStage2(
+            reEvaluatedProb=0.1, thoughtsOnStage1=_filler(), reason=_filler(), reEvaluatedConfidence=80.0,
+            errorSpanStart=0, errorSpanEnd=span_end, errorSpanText=mt[:span_end],
+        )
+    for key in STAGE3_KEYS:
+        outputs[key] = AgentOutputStage3(consistencyScore=85.0, errorsExists="NO", existanceReasoning=_filler())
+    outputs["cross_reasoning"] = CrossReasoningOutput(
+        dropped_errors=ERROR_KEYS[:3], retained_errors=ERROR_KEYS[3:6], reasoning=_filler(),
+    )
+    return outputs
+
+
+_schema_tokens = {}
+
+
+def schema_tokens(schema):
+    """Tokens the function-calling tool definition adds to every request for this schema."""
+    if schema not in _schema_tokens:
+        _schema_tokens[schema] = count_tokens(json.dumps(convert_to_openai_tool(schema)))
+    return _schema_tokens[schema]
+
+
+def prompts_for(mode="full"):
+    """The agent prompts one row goes through in the given pipeline mode."""
+    if mode == "express":
+        return EXPRESS_PROMPTS
+    if mode == "fused":
+        prompts = {node: entry for node, entry in AGENT_PROMPTS.items() if node not in ERROR_KEYS}
+        prompts.update(FUSED_STAGE2_PROMPTS)
+        return prompts
+    return AGENT_PROMPTS
+
+
+def estimate_row(source, mt, reference, mode="full"):
+    """{node: (prompt_tokens, completion_tokens)} for one row, rendering every agent prompt locally."""
+    state = {"source": str(source), "mt": str(mt), "reference": str(reference)}
+    outputs = stand_in_outputs(state["mt"])
+    state.update(outputs)
+
+    estimate = {}
+    for node, (prompt_template, schema, build_inputs) in prompts_for(mode).items():
+        inputs = build_inputs(state)
+        messages = prompt_template.format_messages(**inputs)
+        prompt_tokens = count_message_tokens(messages) + schema_tokens(schema)
+        output = outputs.get(node)
+        if output is None:
+            verdicts = [
+                SubtypeVerdictStage2(subtype=subtype, **outputs[subtype].model_dump()) for subtype in inputs["subtypes"]
+            ]
+            if schema is ExpressOutput:
+                output = ExpressOutput(verdicts=verdicts, **outputs["cross_reasoning"].model_dump())
+            else:
+                output = FusedOutputStage2(verdicts=verdicts)
+        completion_tokens = count_tokens(output.model_dump_json())
+        estimate[node] = (prompt_tokens, completion_tokens)
+    return estimate
+
+
+class DryRunReport:
+    def __init__(self, mode="full"):
+        self.mode = mode
+        self.rows = 0
+        self.calls = 0
+        self.duplicates = 0
+        self.prompt_tokens = defaultdict(int)
+        self.completion_tokens = defaultdict(int)
+
+    def add(self, estimate):
+        self.rows += 1
+        self.calls += len(estimate)
+        for node, (prompt_tokens, completion_tokens) in estimate.items():
+            self.prompt_tokens[node] += prompt_tokens
+            self.completion_tokens[node] += completion_tokens
+
+    def totals(self):
+        return sum(self.prompt_tokens.values()), sum(self.completion_tokens.values())
+
+    def projection(self, rpm=None, tpm=None, concurrency=8, call_latency=3.0):
+        """
+        Wall-clock estimate: the slowest of the request quota, the token quota, and the
+        latency bound of running `concurrency` rows at once through CRITICAL_PATH_HOPS hops.
+        """
+        calls = self.calls
+        prompt_tokens, completion_tokens = self.totals()
+        bounds = {
+            "latency_bound_seconds": self.rows / max(1, concurrency) * CRITICAL_PATH_HOPS[self.mode] * call_latency,
+        }
+        if rpm:
+            bounds["rpm_bound_seconds"] = calls / rpm * 60.0
+        if tpm:
+            bounds["tpm_bound_seconds"] = (prompt_tokens + completion_tokens) / tpm * 60.0
+        bounds["projected_seconds"] = max(bounds.values())
+        return bounds
+
+    def to_dict(self, **quota):
+        prompt_tokens, completion_tokens = self.totals()
+        per_node = {
+            node: {
+                "prompt_tokens": self.prompt_tokens[node],
+                "completion_tokens": self.completion_tokens[node],
+                "prompt_tokens_per_row": self.prompt_tokens[node] / self.rows if self.rows else None,
+            }
+            for node in sorted(self.prompt_tokens, key=self.prompt_tokens.get, reverse=True)
+        }
+        return {
+            "mode": self.mode,
+            "rows": self.rows,
+            "duplicate_rows_skipped": self.duplicates,
+            "calls": self.calls,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "per_node": per_node,
+            "projection": self.projection(**quota),
+        }
+
+    def format(self, **quota):
+        report = self.to_dict(**quota)
+        lines = [
+            f"Dry run ({self.mode} mode) over {report['rows']} rows ({self.duplicates} duplicates skipped): {report['calls']} calls, "
+            f"{report['prompt_tokens']} prompt + {report['completion_tokens']} completion tokens",
+            f"{'node':<28}{'prompt':>14}{'completion':>14}{'prompt/row':>12}",
+        ]
+        for node, n in report["per_node"].items():
+            lines.append(
+                f"{node:<28}{n['prompt_tokens']:>14}{n['completion_tokens']:>14}{n['prompt_tokens_per_row'] or 0:>12.0f}"
+            )
+        for name, seconds in report["projection"].items():
+            lines.append(f"{name}: {seconds:.0f} ({seconds / 3600.0:.2f} h)")
+        return "\n".join(lines)
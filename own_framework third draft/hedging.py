@@ -0,0 +1,77 @@
+import asyncio
+
+from concurrency_controller import percentile
+from progress import run_stats, stage_of
+from rate_limiter import limiter
+
+
+class RequestHedger:
+    """
+    Sends a duplicate of an agent call that is still running after the `quantile` latency of
+    its stage (from run_stats, once min_samples calls have been seen) and returns whichever
+    answers first; the other is cancelled. Duplicates go through the shared rate limiter and
+    are capped at max_extra (a fraction) of all calls, so hedging costs at most that much more.
+    The cancelled loser's usage is never reported, so it is in neither the cost ledger nor the
+    limiter's token settlement; its tokens stay reserved at the estimate.
+    """
+
+    def __init__(self, quantile=0.95, max_extra=0.05, min_samples=20, min_delay=1.0):
+        self.quantile = quantile
+        self.max_extra = max_extra
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.over_budget = 0
+
+    def delay_for(self, node):
+        samples = run_stats.stage_latency.get(stage_of(node))
+        if not samples or len(samples) < self.min_samples:
+            return None
+        return max(self.min_delay, percentile(samples, self.quantile))
+
+    async def call(self, structured_llm, messages, node, estimated_tokens):
+        self.calls += 1
+        primary = asyncio.ensure_future(structured_llm.ainvoke(messages))
+        hedge = None
+        try:
+            delay = self.delay_for(node)
+            if delay is None:
+                return await primary
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done:
+                return primary.result()
+            if self.hedges + 1 > self.max_extra * self.calls:
+                self.over_budget += 1
+                return await primary
+
+            self.hedges += 1
+            await limiter.acquire(estimated_tokens)
+            hedge = asyncio.ensure_future(structured_llm.ainvoke(messages))
+            pending = {primary, hedge}
+            failure = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedge_wins += 1
+                        return task.result()
+                    if failure is None or task is primary:
+                        failure = task.exception()
+            raise failure
+        finally:
+            # also on cancellation (e.g. the row deadline): stop paying for calls nobody will read
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "extra_rate": self.hedges / self.calls if self.calls else 0.0,
+            "over_budget": self.over_budget,
+        }
@@ -0,0 +1,183 @@
+import asyncio
+import os
+import time
+from collections import deque
+
+import httpx
+
+from concurrency_controller import percentile
+
+try:
+    import h2  # noqa: F401  (optional: pip install "httpx[http2]")
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+def pool_settings():
+    """Connection-pool knobs for the OpenAI clients, from OPENAI_* environment variables."""
+    http2 = os.getenv("OPENAI_HTTP2", "0") == "1"
+    if http2 and not HTTP2_AVAILABLE:
+        print('OPENAI_HTTP2=1 but the h2 package is missing (pip install "httpx[http2]"); using HTTP/1.1')
+        http2 = False
+    return {
+        "max_connections": int(os.getenv("OPENAI_MAX_CONNECTIONS", "100")),
+        "max_keepalive_connections": int(os.getenv("OPENAI_MAX_KEEPALIVE", "100")),
+        "keepalive_expiry": float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "30")),
+        "max_per_host": int(os.getenv("OPENAI_MAX_PER_HOST", "0")) or None,
+        "http2": http2,
+    }
+
+
+class PoolStats:
+    """
+    Where a request's time goes before the provider sees it: waiting for a per-host slot,
+    waiting for a pooled connection, and opening a new connection (TCP + TLS).
+    """
+
+    def __init__(self, window=1000):
+        self.requests = 0
+        self.new_connections = 0
+        self.in_flight = 0
+        self.host_wait = deque(maxlen=window)
+        self.pool_wait = deque(maxlen=window)
+        self.connect = deque(maxlen=window)
+        self.response = deque(maxlen=window)
+
+    def snapshot(self):
+        def summary(values):
+            return {"p50": percentile(values, 0.5), "p95": percentile(values, 0.95)}
+
+        return {
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "in_flight": self.in_flight,
+            "host_wait_seconds": summary(self.host_wait),
+            "pool_wait_seconds": summary(self.pool_wait),
+            "connect_seconds": summary(self.connect),
+            "response_seconds": summary(self.response),
+        }
+
+
+pool_stats = PoolStats()
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body that gives the per-host slot back once the body is closed."""
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+class MeteredTransport(httpx.AsyncBaseTransport):
+    """
+    Wraps the pooled transport with an optional cap on concurrent requests per host and records
+    per-request pool-wait, connect and time-to-headers in pool_stats (via httpcore trace events).
+    """
+
+    def __init__(self, inner, max_per_host=None, stats=pool_stats):
+        self.inner = inner
+        self.max_per_host = max_per_host
+        self.stats = stats
+        self._host_slots = {}
+        self._loop = None
+
+    def _slot(self, host):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._host_slots = {}
+        if host not in self._host_slots:
+            self._host_slots[host] = asyncio.Semaphore(self.max_per_host)
+        return self._host_slots[host]
+
+    async def handle_async_request(self, request):
+        stats = self.stats
+        slot = self._slot(request.url.host) if self.max_per_host else None
+        started = time.monotonic()
+        if slot is not None:
+            await slot.acquire()
+        entered = time.monotonic()
+        stats.host_wait.append(entered - started)
+
+        marks = {}
+
+        async def trace(event, info):
+            now = time.monotonic()
+            if "pool_wait" not in marks and (
+                event.endswith("connect_tcp.started") or event.endswith("send_request_headers.started")
+            ):
+                marks["pool_wait"] = now - entered
+            if event.endswith("connect_tcp.started"):
+                marks["connect_started"] = now
+                stats.new_connections += 1
+            elif event.endswith("start_tls.complete") or (
+                event.endswith("connect_tcp.complete") and request.url.scheme == "http"
+            ):
+                marks["connect"] = now - marks.get("connect_started", now)
+
+        request.extensions = {**request.extensions, "trace": trace}
+        stats.requests += 1
+        stats.in_flight += 1
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                stats.in_flight -= 1
+                if slot is not None:
+                    slot.release()
+
+        try:
+            response = await self.inner.handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+
+        stats.pool_wait.append(marks.get("pool_wait", 0.0))
+        if "connect" in marks:
+            stats.connect.append(marks["connect"])
+        stats.response.append(time.monotonic() - entered)
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_ReleasingStream(response.stream, release),
+            extensions=response.extensions,
+            request=request,
+        )
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+
+def make_async_client(settings=None):
+    settings = settings or pool_settings()
+    limits = httpx.Limits(
+        max_connections=settings["max_connections"],
+        max_keepalive_connections=settings["max_keepalive_connections"],
+        keepalive_expiry=settings["keepalive_expiry"],
+    )
+    transport = httpx.AsyncHTTPTransport(limits=limits, http2=settings["http2"])
+    return httpx.AsyncClient(transport=MeteredTransport(transport, settings["max_per_host"]), follow_redirects=True)
+
+
+def make_sync_client(settings=None):
+    settings = settings or pool_settings()
+    limits = httpx.Limits(
+        max_connections=settings["max_connections"],
+        max_keepalive_connections=settings["max_keepalive_connections"],
+        keepalive_expiry=settings["keepalive_expiry"],
+    )
+    return httpx.Client(limits=limits, http2=settings["http2"], follow_redirects=True)
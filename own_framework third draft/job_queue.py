@@ -0,0 +1,231 @@
+import csv
+import itertools
+import json
+import sqlite3
+import time
+from contextlib import closing
+
+from metrics import MetricsAccumulator
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    row_id INTEGER PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    input TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, row_id);
+CREATE TABLE IF NOT EXISTS results (
+    row_id INTEGER PRIMARY KEY,
+    payload TEXT NOT NULL,
+    worker TEXT NOT NULL,
+    committed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS failures (
+    row_id INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    worker TEXT NOT NULL,
+    failed_at REAL NOT NULL
+);
+"""
+
+
+class JobQueue:
+    """
+    Durable row queue in a SQLite database that several worker processes pull from.
+
+    The database uses the rollback journal rather than WAL: WAL needs every process to share
+    memory on one host, so it breaks on a network filesystem. With the rollback journal, workers
+    on several machines may share the file, but only if the filesystem implements POSIX
+    advisory locks correctly (e.g. NFSv4 with locking enabled, not SMB or most FUSE mounts). If
+    locking is unreliable, lease exclusivity and exactly-once commit are not guaranteed; keep
+    all workers on one host in that case. Point LLM_CACHE_PATH at a host-local file for workers
+    on other machines (the response cache uses WAL).
+
+    Workers lease batches of rows for lease_seconds and renew() them while working. Leases that
+    expire (crashed or stalled worker) go back to pending the next time anyone leases. complete()
+    only commits a result while the caller still holds the row's lease, so every row ends up with
+    exactly one committed result even if two workers evaluated it.
+    """
+
+    def __init__(self, path, busy_timeout=30.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=DELETE")
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        # one short-lived connection per operation keeps the queue usable from worker threads
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+        conn.execute("PRAGMA synchronous=FULL")
+        return conn
+
+    def _transaction(self, conn):
+        conn.execute("BEGIN IMMEDIATE")
+        return conn
+
+    def populate(self, rows, batch_size=500):
+        """
+        Add (row_id, content_hash, record) jobs. Idempotent: existing rows are left alone unless
+        their content hash changed, in which case the old result is dropped and the row re-queued.
+        rows is consumed batch_size at a time outside any transaction and each batch is committed
+        on its own, so workers already running are never locked out for long.
+        """
+        added = 0
+        rows = iter(rows)
+        while True:
+            batch = [(row_id, content_hash, json.dumps(record, ensure_ascii=False))
+                     for row_id, content_hash, record in itertools.islice(rows, batch_size)]
+            if not batch:
+                return added
+            with closing(self._connect()) as conn:
+                self._transaction(conn)
+                for row_id, content_hash, record in batch:
+                    existing = conn.execute("SELECT content_hash FROM jobs WHERE row_id = ?", (row_id,)).fetchone()
+                    if existing is None:
+                        conn.execute(
+                            "INSERT INTO jobs (row_id, content_hash, input) VALUES (?, ?, ?)",
+                            (row_id, content_hash, record),
+                        )
+                        added += 1
+                    elif existing[0] != content_hash:
+                        conn.execute(
+                            "UPDATE jobs SET content_hash = ?, input = ?, status = 'pending', attempts = 0, "
+                            "lease_owner = NULL, lease_expires = NULL WHERE row_id = ?",
+                            (content_hash, record, row_id),
+                        )
+                        conn.execute("DELETE FROM results WHERE row_id = ?", (row_id,))
+                        added += 1
+                conn.execute("COMMIT")
+
+    def lease(self, worker, limit, lease_seconds):
+        """Lease up to limit pending rows (after re-queueing expired leases). Returns [(row_id, record)]."""
+        if limit <= 0:
+            return []
+        now = time.time()
+        with closing(self._connect()) as conn:
+            self._transaction(conn)
+            conn.execute(
+                "UPDATE jobs SET status = 'pending', lease_owner = NULL, lease_expires = NULL "
+                "WHERE status = 'leased' AND lease_expires < ?",
+                (now,),
+            )
+            rows = conn.execute(
+                "SELECT row_id, input FROM jobs WHERE status = 'pending' ORDER BY row_id LIMIT ?",
+                (limit,),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE jobs SET status = 'leased', lease_owner = ?, lease_expires = ?, attempts = attempts + 1 "
+                "WHERE row_id = ?",
+                [(worker, now + lease_seconds, row_id) for row_id, _ in rows],
+            )
+            conn.execute("COMMIT")
+        return [(row_id, json.loads(record)) for row_id, record in rows]
+
+    def renew(self, worker, row_ids, lease_seconds):
+        expires = time.time() + lease_seconds
+        with closing(self._connect()) as conn:
+            self._transaction(conn)
+            conn.executemany(
+                "UPDATE jobs SET lease_expires = ? WHERE row_id = ? AND status = 'leased' AND lease_owner = ?",
+                [(expires, row_id, worker) for row_id in row_ids],
+            )
+            conn.execute("COMMIT")
+
+    def complete(self, worker, row_id, payload):
+        """Commit payload as row_id's result if worker still holds the lease. Returns whether it was committed."""
+        with closing(self._connect()) as conn:
+            self._transaction(conn)
+            cur = conn.execute(
+                "UPDATE jobs SET status = 'done', lease_owner = NULL, lease_expires = NULL "
+                "WHERE row_id = ? AND status = 'leased' AND lease_owner = ?",
+                (row_id, worker),
+            )
+            committed = cur.rowcount == 1
+            if committed:
+                conn.execute(
+                    "INSERT OR REPLACE INTO results (row_id, payload, worker, committed_at) VALUES (?, ?, ?, ?)",
+                    (row_id, json.dumps(payload, ensure_ascii=False), worker, time.time()),
+                )
+            conn.execute("COMMIT")
+        return committed
+
+    def fail(self, worker, row_id, payload, max_attempts):
+        """Record a failed attempt; the row is re-queued until it has been tried max_attempts times."""
+        with closing(self._connect()) as conn:
+            self._transaction(conn)
+            row = conn.execute(
+                "SELECT attempts FROM jobs WHERE row_id = ? AND status = 'leased' AND lease_owner = ?",
+                (row_id, worker),
+            ).fetchone()
+            if row is not None:
+                status = "failed" if row[0] >= max_attempts else "pending"
+                conn.execute(
+                    "UPDATE jobs SET status = ?, lease_owner = NULL, lease_expires = NULL WHERE row_id = ?",
+                    (status, row_id),
+                )
+                conn.execute(
+                    "INSERT INTO failures (row_id, payload, worker, failed_at) VALUES (?, ?, ?, ?)",
+                    (row_id, json.dumps(payload, ensure_ascii=False), worker, time.time()),
+                )
+            conn.execute("COMMIT")
+
+    def counts(self):
+        with closing(self._connect()) as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def has_open_jobs(self):
+        counts = self.counts()
+        return counts.get("pending", 0) + counts.get("leased", 0) > 0
+
+    def iter_results(self):
+        with closing(self._connect()) as conn:
+            for (payload,) in conn.execute("SELECT payload FROM results ORDER BY row_id"):
+                yield json.loads(payload)
+
+    def iter_final_failures(self):
+        """Last recorded failure of every row that ended in status 'failed'."""
+        with closing(self._connect()) as conn:
+            query = (
+                "SELECT f.payload FROM failures f JOIN jobs j ON j.row_id = f.row_id "
+                "WHERE j.status = 'failed' AND f.failed_at = "
+                "(SELECT MAX(failed_at) FROM failures WHERE row_id = f.row_id) ORDER BY f.row_id"
+            )
+            for (payload,) in conn.execute(query):
+                yield json.loads(payload)
+
+
+def _write_csv(path, rows, fieldnames=None):
+    written = 0
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = None
+        for row in rows:
+            if writer is None:
+                writer = csv.DictWriter(f, fieldnames=fieldnames or list(row), lineterminator="\n")
+                writer.writeheader()
+            writer.writerow(row)
+            written += 1
+    return written
+
+
+def export_queue(queue, output_path, failure_path, summary_path, columns):
+    """Write the committed results and final failures in row_id order, as a single-process run would, plus the summary."""
+    metrics = MetricsAccumulator()
+
+    def results():
+        for row in queue.iter_results():
+            metrics.add(json.loads(row["gold_errors"]), json.loads(row["top5_predicted"]), json.loads(row["hits"]))
+            yield row
+
+    written = _write_csv(output_path, results(), columns)
+    print(f"[queue] {written} result rows -> {output_path}")
+    metrics.rows_failed = _write_csv(failure_path, queue.iter_final_failures())
+    print(f"[queue] {metrics.rows_failed} failed rows -> {failure_path}")
+    metrics.write_summary(summary_path)
+    print(f"[queue] summary -> {summary_path}")
+    return metrics
@@ -0,0 +1,158 @@
+import ast
+import hashlib
+import json
+import os
+import random
+import re
+import shutil
+import time
+import uuid
+
+
+def schema_value(name, schema, defs, rnd, segments=1, subtypes=()):
+    """
+    A deterministic value satisfying a JSON-schema fragment of the kind pydantic emits for our agent
+    outputs. Lists of per-segment outputs (see packing) get one item per segment of the request.
+    Subtype fields are filled from `subtypes`, the names the request lists: one verdict per subtype,
+    and every subtype either retained or dropped, as a well-behaved model would answer.
+    """
+    if "$ref" in schema:
+        return schema_value(name, defs[schema["$ref"].split("/")[-1]], defs, rnd, segments, subtypes)
+    if "anyOf" in schema:
+        return schema_value(name, next(s for s in schema["anyOf"] if s.get("type") != "null"), defs, rnd,
+                            subtypes=subtypes)
+    if "enum" in schema:
+        return rnd.choice(schema["enum"])
+    kind = schema.get("type")
+    if kind == "number":
+        return round(rnd.uniform(schema.get("minimum", 0.0), schema.get("maximum", 1.0)), 3)
+    if kind == "integer":
+        return rnd.randint(schema.get("minimum", 0), schema.get("maximum", 10))
+    if kind == "string":
+        if name == "subtype" and subtypes:
+            return rnd.choice(subtypes)
+        return f"{name} (local stand-in)"
+    if kind == "boolean":
+        return rnd.random() < 0.5
+    if kind == "array":
+        items = schema.get("items", {"type": "string"})
+        item_schema = defs[items["$ref"].split("/")[-1]] if "$ref" in items else items
+        properties = item_schema.get("properties", {})
+        if "segment" in properties:
+            return [dict(schema_value(name, items, defs, rnd, subtypes=subtypes), segment=index)
+                    for index in range(segments)]
+        if "subtype" in properties and subtypes:
+            return [dict(schema_value(name, items, defs, rnd, subtypes=subtypes), subtype=subtype)
+                    for subtype in subtypes]
+        return [schema_value(name, items, defs, rnd, subtypes=subtypes)]
+    value = {key: schema_value(key, part, defs, rnd, segments, subtypes)
+             for key, part in schema.get("properties", {}).items()}
+    if subtypes and {"retained_errors", "dropped_errors"} <= value.keys():
+        value["retained_errors"] = [subtype for subtype in subtypes if rnd.random() < 0.5]
+        value["dropped_errors"] = [subtype for subtype in subtypes if subtype not in value["retained_errors"]]
+    return value
+
+
+def listed_subtypes(messages):
+    """Subtype names a request asks about (SUBTYPES TO EVALUATE, or cross-reasoning's Subtype list), if any."""
+    match = re.search(r"(?:SUBTYPES TO EVALUATE:|Subtype list:)\s*(\[[^\]]*\])", str(messages[-1].get("content", "")))
+    return ast.literal_eval(match.group(1)) if match else []
+
+
+def stand_in_completion(body):
+    """Chat completion with a schema-valid forced tool call, seeded by the request so reruns agree."""
+    tool = body["tools"][0]["function"]
+    parameters = tool["parameters"]
+    seed = hashlib.sha256(json.dumps(body["messages"], sort_keys=True).encode("utf-8")).hexdigest()
+    segments = str(body["messages"][-1].get("content", "")).count("=== SEGMENT ")
+    arguments = schema_value("root", parameters, parameters.get("$defs", {}), random.Random(seed), max(segments, 1),
+                             listed_subtypes(body["messages"]))
+    prompt_tokens = sum(len(str(m.get("content", ""))) for m in body["messages"]) // 4
+    completion_tokens = len(json.dumps(arguments)) // 4
+    return {
+        "id": f"chatcmpl-{seed[:24]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body["model"],
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [{
+                    "id": f"call_{seed[:24]}",
+                    "type": "function",
+                    "function": {"name": tool["name"], "arguments": json.dumps(arguments)},
+                }],
+            },
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+class LocalBatchClient:
+    """
+    File-based stand-in for the Batch API, for running the batch backend offline. Each submitted
+    batch gets a directory under root; it reports in_progress for `latency` seconds and is then
+    answered line by line by responder(body) -> chat completion (stand_in_completion by default).
+    Same interface as batch_runner.OpenAIBatchClient.
+    """
+
+    def __init__(self, root, latency=0.0, responder=stand_in_completion):
+        self.root = root
+        self.latency = latency
+        self.responder = responder
+        os.makedirs(root, exist_ok=True)
+
+    def _dir(self, batch_id):
+        return os.path.join(self.root, batch_id)
+
+    def _write_meta(self, batch_id, meta):
+        tmp_path = os.path.join(self._dir(batch_id), "batch.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(self._dir(batch_id), "batch.json"))
+
+    def submit(self, path):
+        batch_id = f"batch_local_{uuid.uuid4().hex[:16]}"
+        os.makedirs(self._dir(batch_id))
+        shutil.copyfile(path, os.path.join(self._dir(batch_id), "input.jsonl"))
+        self._write_meta(batch_id, {
+            "id": batch_id, "status": "in_progress", "created_at": time.time(),
+            "output_file_id": None, "error_file_id": None,
+        })
+        return batch_id
+
+    def retrieve(self, batch_id):
+        with open(os.path.join(self._dir(batch_id), "batch.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["status"] == "in_progress" and time.time() - meta["created_at"] >= self.latency:
+            self._process(batch_id, meta)
+        return meta
+
+    def _process(self, batch_id, meta):
+        output_path = os.path.join(self._dir(batch_id), "output.jsonl")
+        error_path = os.path.join(self._dir(batch_id), "errors.jsonl")
+        with open(os.path.join(self._dir(batch_id), "input.jsonl"), encoding="utf-8") as src, \
+                open(output_path, "w", encoding="utf-8") as out, open(error_path, "w", encoding="utf-8") as err:
+            for line in src:
+                request = json.loads(line)
+                try:
+                    body = self.responder(request["body"])
+                except Exception as e:
+                    err.write(json.dumps({"custom_id": request["custom_id"], "response": None,
+                                          "error": {"code": type(e).__name__, "message": str(e)}}) + "\n")
+                    continue
+                out.write(json.dumps({"custom_id": request["custom_id"],
+                                      "response": {"status_code": 200, "body": body}, "error": None}) + "\n")
+        meta.update(status="completed", output_file_id=output_path, error_file_id=error_path)
+        self._write_meta(batch_id, meta)
+
+    def content(self, file_id):
+        with open(file_id, encoding="utf-8") as f:
+            return f.read()
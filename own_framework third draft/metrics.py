@@ -0,0 +1,82 @@
+import json
+import os
+from collections import Counter
+
+
+class MetricsAccumulator:
+    """
+    Running top-5 metrics over finished rows. Produces the same summary the driver used
+    to compute by re-reading the results CSV, but is updated row by row. `throughput`, when
+    set, is saved with the summary (see the driver's run_throughput).
+    """
+
+    def __init__(self):
+        self.rows_total = 0
+        self.rows_failed = 0
+        self.rows_with_gold = 0
+        self.rows_with_hit = 0
+        self.recall_sum = 0.0
+        self.precision_sum = 0.0
+        self.exact_match = 0
+        self.exact_containment = 0
+        self.per_error_total = Counter()
+        self.per_error_hit = Counter()
+        self.throughput = None
+
+    def add(self, gold_errors, top5_predicted, hits):
+        self.rows_total += 1
+        for g in gold_errors:
+            self.per_error_total[g] += 1
+        for h in hits:
+            self.per_error_hit[h] += 1
+
+        if not gold_errors:
+            return
+
+        gold = set(gold_errors)
+        self.rows_with_gold += 1
+        self.rows_with_hit += 1 if hits else 0
+        self.recall_sum += len(hits) / len(gold)
+        self.precision_sum += len(hits) / 5.0
+        self.exact_match += 1 if set(top5_predicted) == gold else 0
+        self.exact_containment += 1 if len(hits) == len(gold) else 0
+
+    def add_failure(self):
+        self.rows_failed += 1
+
+    def _rate(self, count):
+        return count / self.rows_with_gold if self.rows_with_gold else None
+
+    def summary(self):
+        return {
+            "rows_total": self.rows_total,
+            "rows_with_gold_errors": self.rows_with_gold,
+            "rows_failed": self.rows_failed,
+            "hit_at_5": self._rate(self.rows_with_hit),
+            "mean_recall_at_5": self._rate(self.recall_sum),
+            "mean_precision_at_5": self._rate(self.precision_sum),
+            "exact_match_rate": self._rate(self.exact_match),
+            "exact_containment_rate": self._rate(self.exact_containment),
+            "per_error_recall": {
+                err: (self.per_error_hit[err] / self.per_error_total[err]) if self.per_error_total[err] else None
+                for err in sorted(self.per_error_total)
+            },
+            "throughput": self.throughput,
+        }
+
+    def status_line(self):
+        def fmt(value):
+            return "n/a" if value is None else f"{value:.3f}"
+
+        return (
+            f"rows={self.rows_total} failed={self.rows_failed} "
+            f"hit@5={fmt(self._rate(self.rows_with_hit))} "
+            f"recall@5={fmt(self._rate(self.recall_sum))} "
+            f"precision@5={fmt(self._rate(self.precision_sum))}"
+        )
+
+    def write_summary(self, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
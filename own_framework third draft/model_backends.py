@@ -0,0 +1,117 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, convert_to_openai_messages
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from langchain_openai import ChatOpenAI
+
+from http_pool import make_async_client, make_sync_client, pool_settings
+from local_batch import stand_in_completion
+
+
+DEFAULT_MODEL = "gpt-4o-mini"
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic in-process chat model: every forced tool call is answered with a schema-valid
+    stand-in (local_batch.stand_in_completion) seeded by the request, after `latency` seconds.
+    No network, so a run measures only the graph, limiter, cache and writer overhead.
+    """
+
+    model_name: str = "fake-deterministic"
+    temperature: float = 0.0
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self):
+        return "fake-deterministic"
+
+    def bind_tools(self, tools, *, tool_choice=None, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _complete(self, messages, tools):
+        if not tools:
+            raise ValueError("the fake backend only answers structured (tool-calling) requests")
+        body = {"model": self.model_name, "messages": convert_to_openai_messages(messages), "tools": tools}
+        completion = stand_in_completion(body)
+        call = completion["choices"][0]["message"]["tool_calls"][0]
+        usage = completion["usage"]
+        message = AIMessage(
+            content="",
+            tool_calls=[{"name": call["function"]["name"], "args": json.loads(call["function"]["arguments"]),
+                         "id": call["id"], "type": "tool_call"}],
+            usage_metadata={"input_tokens": usage["prompt_tokens"], "output_tokens": usage["completion_tokens"],
+                            "total_tokens": usage["total_tokens"]},
+            response_metadata={"model_name": self.model_name, "finish_reason": "stop"},
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, tools: Optional[List[Any]] = None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._complete(messages, tools)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, tools: Optional[List[Any]] = None, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._complete(messages, tools)
+
+
+# The OpenAI clients never retry on their own: chain_runner.invoke_structured retries each call under
+# the RetryPolicy, so retries are paced by the rate limiter and throttles reach the AIMD controller.
+def openai_backend(model=None):
+    pool = pool_settings()
+    return ChatOpenAI(
+        model=model or DEFAULT_MODEL, temperature=0, max_retries=0, timeout=120,
+        http_async_client=make_async_client(pool), http_client=make_sync_client(pool),
+    )
+
+
+def local_backend(model=None):
+    """Any OpenAI-compatible server (vLLM, llama.cpp server, ...) at LOCAL_LLM_BASE_URL."""
+    pool = pool_settings()
+    return ChatOpenAI(
+        model=model or os.getenv("LOCAL_LLM_MODEL", "local-model"), temperature=0, max_retries=0,
+        timeout=float(os.getenv("LOCAL_LLM_TIMEOUT", "300")),
+        base_url=os.getenv("LOCAL_LLM_BASE_URL", "http://127.0.0.1:8000/v1"),
+        api_key=os.getenv("LOCAL_LLM_API_KEY", "not-needed"),
+        http_async_client=make_async_client(pool), http_client=make_sync_client(pool),
+    )
+
+
+def fake_backend(model=None):
+    return FakeChatModel(model_name=model or "fake-deterministic", latency=float(os.getenv("FAKE_LLM_LATENCY", "0")))
+
+
+# LLM_BACKEND name -> fn(model name or None) -> chat model
+BACKENDS = {
+    "openai": openai_backend,
+    "local": local_backend,
+    "fake": fake_backend,
+}
+
+
+def model_label(llm):
+    """
+    Name results, cache entries and costs are recorded under: the bare model name on the OpenAI API,
+    "model@fake" on the fake backend and "model@base_url" on any other OpenAI-compatible server, so
+    runs on different backends never share a resume version, a cached answer or a price.
+    """
+    if isinstance(llm, FakeChatModel):
+        return f"{llm.model_name}@fake"
+    base_url = getattr(llm, "openai_api_base", None)
+    return f"{llm.model_name}@{base_url}" if base_url else llm.model_name
+
+
+def make_llm(backend=None, model=None):
+    """Chat model for LLM_BACKEND (default openai), with LLM_MODEL overriding the backend's default model."""
+    backend = backend or os.getenv("LLM_BACKEND", "openai")
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown LLM_BACKEND {backend!r}; choose from {', '.join(BACKENDS)}")
+    return BACKENDS[backend](model or os.getenv("LLM_MODEL") or None)
@@ -1,11 +1,14 @@
+import asyncio
 from langgraph.graph import StateGraph, END
 from langchain_core.prompts import ChatPromptTemplate
 # from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_openai import ChatOpenAI
 from typing import TypedDict, Dict, List, Optional, Literal, Annotated, Any
 from own_framework_prompts import *
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
+from chain_runner import run_chain
+from model_backends import make_llm, model_label
+from prompt_layout import STAGE1_STATIC, STAGE2_STATIC, static_first, sectioned
 load_dotenv()
 
 class AgentOutputStage1(BaseModel):
@@ -22,6 +25,12 @@ class AgentOutputStage2(BaseModel):
     errorSpanEnd: Optional[int] = Field(..., description="index AFTER the last character  (Python slice convention)")
     errorSpanText: Optional[str] = Field(..., description="exactly mt_string[start:end]  (copy-paste, no changes)")
 
+class SubtypeVerdictStage2(AgentOutputStage2):
+    subtype: str = Field(..., description="The subtype this verdict is for, exactly as named in SUBTYPES TO EVALUATE.")
+
+class FusedOutputStage2(BaseModel):
+    verdicts: List[SubtypeVerdictStage2] = Field(..., description="One verdict per subtype listed in SUBTYPES TO EVALUATE.")
+
 
 class AgentOutputStage3(BaseModel):
     consistencyScore: float = Field(..., description="Based on the evaluations of the previous agents, generate a score out of 100 on how consistent the agents are with each other.")
@@ -33,6 +42,12 @@ class CrossReasoningOutput(BaseModel):
     retained_errors: List[str] = Field(..., description="Subtype errors that remain supported after cross-reasoning.")
     reasoning: str = Field(..., description="Brief explanation of which errors were merged, removed, or kept.")
 
+class ExpressOutput(BaseModel):
+    verdicts: List[SubtypeVerdictStage2] = Field(..., description="One verdict per subtype listed in SUBTYPES TO EVALUATE.")
+    dropped_errors: List[str] = Field(..., description="Subtype errors that should be treated as redundant, unsupported, or dominated by stronger evidence.")
+    retained_errors: List[str] = Field(..., description="Subtype errors that remain supported after cross-checking the verdicts.")
+    reasoning: str = Field(..., description="Brief explanation of which errors were merged, removed, or kept.")
+
 class AggregationOutput(TypedDict):
     accuracy_error: float
     fluency_error: float
@@ -76,11 +91,40 @@ class MTState(TypedDict):
     aggregation: Optional[AggregationOutput]
 
 
-llm = ChatOpenAI(model="gpt-4o-mini", temperature=0, max_retries=5, timeout=120)
+# chosen by LLM_BACKEND (openai, local or fake) and LLM_MODEL, see model_backends; built on first
+# use, so rendering prompts (--dry-run) or merging results needs no API key
+_llm = None
+_structured_llms = {}
+
+def get_llm():
+    global _llm
+    if _llm is None:
+        _llm = make_llm()
+    return _llm
+
+def llm_label():
+    """What resume versions, cache keys and the cost ledger record calls under (backend included)."""
+    return model_label(get_llm())
+
+def structured_llm(schema, model=None):
+    if model is not None:
+        return model.with_structured_output(schema, method="function_calling", include_raw=True)
+    if schema not in _structured_llms:
+        _structured_llms[schema] = get_llm().with_structured_output(schema, method="function_calling", include_raw=True)
+    return _structured_llms[schema]
+
+# node state_key -> (prompt_template, output schema, fn(state) -> prompt inputs), filled by the factories below
+AGENT_PROMPTS = {}
+# same for the fused per-category Stage-2 nodes, which only run in the "fused" pipeline mode
+FUSED_STAGE2_PROMPTS = {}
+# the single-call "express" node
+EXPRESS_PROMPTS = {}
+# subtype state_key -> single-subtype Stage-2 agent, used when a fused call leaves a subtype out
+STAGE2_AGENTS = {}
 
 def make_error_agent_stage1(system_prompt: str, state_key: str):
     prompt_template = ChatPromptTemplate.from_messages([
-        ("system", system_prompt),
+        ("system", static_first(system_prompt, STAGE1_STATIC)),
         ("human", """
         SOURCE SENTENCE: {source}
          
@@ -90,21 +134,25 @@ def make_error_agent_stage1(system_prompt: str, state_key: str):
         """)
     ])
 
-    chain = prompt_template | llm.with_structured_output(AgentOutputStage1, method="function_calling")
-
-    async def agent_fn(state: MTState) -> Dict[str, AgentOutputStage1]:
-        output = await chain.ainvoke({
+    def build_inputs(state: MTState) -> Dict[str, Any]:
+        return {
             "source": state["source"],
             "translated": state["mt"],
             "reference": state["reference"],
-        })
+        }
+
+    AGENT_PROMPTS[state_key] = (prompt_template, AgentOutputStage1, build_inputs)
+
+    async def agent_fn(state: MTState) -> Dict[str, AgentOutputStage1]:
+        output = await run_chain(prompt_template, structured_llm(AgentOutputStage1), build_inputs(state), state_key,
+                                 AgentOutputStage1, llm_label())
 
         return {state_key: output}
     return agent_fn
 
 def make_error_agent_stage2(system_prompt: str, state_key: str, SuperCategory: str):
     prompt_template = ChatPromptTemplate.from_messages([
-        ("system", system_prompt),
+        ("system", static_first(system_prompt, STAGE2_STATIC)),
         ("human", """
         SOURCE SENTENCE: {source}
          
@@ -116,19 +164,80 @@ def make_error_agent_stage2(system_prompt: str, state_key: str, SuperCategory: s
         """)
     ])
 
-    chain = prompt_template | llm.with_structured_output(AgentOutputStage2, method="function_calling")
-
-    async def agent_fn_stage2(state: MTState) -> Dict[str, AgentOutputStage2]:
-        output = await chain.ainvoke({
+    def build_inputs(state: MTState) -> Dict[str, Any]:
+        return {
             "source": state["source"],
             "translated": state["mt"],
             "reference": state["reference"],
             "previous_agent": state[SuperCategory]
-        })
+        }
+
+    AGENT_PROMPTS[state_key] = (prompt_template, AgentOutputStage2, build_inputs)
+
+    async def agent_fn_stage2(state: MTState) -> Dict[str, AgentOutputStage2]:
+        output = await run_chain(prompt_template, structured_llm(AgentOutputStage2), build_inputs(state), state_key,
+                                 AgentOutputStage2, llm_label())
 
         return {state_key: output}
+
+    STAGE2_AGENTS[state_key] = agent_fn_stage2
     return agent_fn_stage2
 
+def subtype_definition(stage2_prompt: str) -> str:
+    """The subtype-specific part of a Stage-2 prompt, without the shared preamble and span rules."""
+    return stage2_prompt.removeprefix(STAGE2_SHARED).removesuffix(SPAN_RULES).strip()
+
+def make_fused_agent_stage2(subtype_prompts: Dict[str, str], state_key: str, SuperCategory: str):
+    """
+    One Stage-2 call for every subtype of a super-category. The verdicts are unpacked into the
+    same MTState keys the single-subtype agents write; subtypes missing from the answer are
+    evaluated by their single-subtype agent instead.
+    """
+    system_prompt = sectioned(STAGE2_FUSED_SHARED, ((subtype, subtype_definition(prompt))
+                                              for subtype, prompt in subtype_prompts.items()))
+    prompt_template = ChatPromptTemplate.from_messages([
+        ("system", system_prompt),
+        ("human", """
+        SOURCE SENTENCE: {source}
+         
+        MACHINE TRANSLATED SENTENCE: {translated}
+         
+        REFERENCE SENTENCE: {reference}
+        
+        PREVIOUS AGENT EVALUATIONS: {previous_agent}
+
+        SUBTYPES TO EVALUATE: {subtypes}
+        """)
+    ])
+
+    def build_inputs(state: MTState) -> Dict[str, Any]:
+        return {
+            "source": state["source"],
+            "translated": state["mt"],
+            "reference": state["reference"],
+            "previous_agent": state[SuperCategory],
+            "subtypes": list(subtype_prompts),
+        }
+
+    FUSED_STAGE2_PROMPTS[state_key] = (prompt_template, FusedOutputStage2, build_inputs)
+
+    async def fused_agent_fn_stage2(state: MTState) -> Dict[str, AgentOutputStage2]:
+        output = await run_chain(prompt_template, structured_llm(FusedOutputStage2), build_inputs(state), state_key,
+                                 FusedOutputStage2, llm_label())
+
+        updates = {}
+        for verdict in output.verdicts:
+            if verdict.subtype in subtype_prompts and verdict.subtype not in updates:
+                updates[verdict.subtype] = AgentOutputStage2(**verdict.model_dump(exclude={"subtype"}))
+
+        missing = [subtype for subtype in subtype_prompts if subtype not in updates]
+        if missing:
+            print(f"[{state_key}] fused call returned no verdict for {missing}; evaluating them one by one")
+            for result in await asyncio.gather(*(STAGE2_AGENTS[subtype](state) for subtype in missing)):
+                updates.update(result)
+        return updates
+    return fused_agent_fn_stage2
+
 def make_error_agent_stage3(system_prompt: str, state_key: str, SuperCategory: str):
     prompt_template = ChatPromptTemplate.from_messages([
         ("system", system_prompt),
@@ -145,33 +254,36 @@ def make_error_agent_stage3(system_prompt: str, state_key: str, SuperCategory: s
         """)
     ])
 
-    chain = prompt_template | llm.with_structured_output(AgentOutputStage3, method="function_calling")
+    if SuperCategory == "accuracyStage1":
+        sub = ["addition", "omission", "mistranslation", "untranslated_text", "transliteration", "non_translation"]
+    elif SuperCategory == "fluencyStage1":
+        sub = ["punctuation", "spelling", "grammar", "register", "inconsistency", "characterEncoding"]
+    elif SuperCategory == "terminologyStage1":
+        sub = ["inappropriate_for_context", "inconsistency_use"]
+    elif SuperCategory == "styleStage1":
+        sub = ["awkward"]
 
-    async def agent_fn_stage3(state: MTState) -> Dict[str, AgentOutputStage3]:
-        if SuperCategory == "accuracyStage1":
-            sub = ["addition", "omission", "mistranslation", "untranslated_text", "transliteration", "non_translation"]
-        elif SuperCategory == "fluencyStage1":
-            sub = ["punctuation", "spelling", "grammar", "register", "inconsistency", "characterEncoding"]
-        elif SuperCategory == "terminologyStage1":
-            sub = ["inappropriate_for_context", "inconsistency_use"]
-        elif SuperCategory == "styleStage1":
-            sub = ["awkward"]
-        
+    def build_inputs(state: MTState) -> Dict[str, Any]:
         combined_sub_category = [state[s] for s in sub if state.get(s) is not None]
 
-        output = await chain.ainvoke({
+        return {
             "source": state["source"],
             "translated": state["mt"],
             "reference": state["reference"],
             "previous_agent": state[SuperCategory],
             "sub_category_agent": combined_sub_category
-        })
+        }
+
+    AGENT_PROMPTS[state_key] = (prompt_template, AgentOutputStage3, build_inputs)
+
+    async def agent_fn_stage3(state: MTState) -> Dict[str, AgentOutputStage3]:
+        output = await run_chain(prompt_template, structured_llm(AgentOutputStage3), build_inputs(state), state_key,
+                                 AgentOutputStage3, llm_label())
 
         return {state_key: output}
     return agent_fn_stage3
 
-async def cross_reasoning_node(state: MTState) -> Dict[str, CrossReasoningOutput]:
-    ERROR_KEYS = [
+ERROR_KEYS = [
     "addition",
     "omission",
     "mistranslation",
@@ -187,11 +299,11 @@ async def cross_reasoning_node(state: MTState) -> Dict[str, CrossReasoningOutput
     "inappropriate_for_context",
     "inconsistency_use",
     "awkward",
-    ]
+]
 
-    cross_reasoning_prompt = ChatPromptTemplate.from_messages([
-        ("system", CROSS_RESONING_PROMPT),
-        ("human", """
+cross_reasoning_prompt = ChatPromptTemplate.from_messages([
+    ("system", CROSS_RESONING_PROMPT),
+    ("human", """
     SOURCE SENTENCE: {source}
 
     MACHINE TRANSLATED SENTENCE: {translated}
@@ -207,11 +319,10 @@ async def cross_reasoning_node(state: MTState) -> Dict[str, CrossReasoningOutput
     Subtype list:
     {error_keys}
     """
-        ),
-    ])
-
-    cross_reasoning_chain = cross_reasoning_prompt | llm.with_structured_output(CrossReasoningOutput, method="function_calling")
+    ),
+])
 
+def cross_reasoning_inputs(state: MTState) -> Dict[str, Any]:
     subtype_outputs = {
         key: state.get(key).model_dump() if state.get(key) is not None else None
         for key in ERROR_KEYS
@@ -224,17 +335,75 @@ async def cross_reasoning_node(state: MTState) -> Dict[str, CrossReasoningOutput
         "styleStage3": state.get("styleStage3").model_dump() if state.get("styleStage3") is not None else None,
     }
 
-    output = await cross_reasoning_chain.ainvoke({
+    return {
         "source": state["source"],
         "translated": state["mt"],
         "reference": state["reference"],
         "subtype_outputs": subtype_outputs,
         "stage3_outputs": stage3_outputs,
         "error_keys": ERROR_KEYS,
-    })
+    }
+
+AGENT_PROMPTS["cross_reasoning"] = (cross_reasoning_prompt, CrossReasoningOutput, cross_reasoning_inputs)
+
+async def cross_reasoning_node(state: MTState) -> Dict[str, CrossReasoningOutput]:
+    output = await run_chain(cross_reasoning_prompt, structured_llm(CrossReasoningOutput), cross_reasoning_inputs(state),
+                             "cross_reasoning", CrossReasoningOutput, llm_label())
 
     return {"cross_reasoning": output}
 
+def make_express_agent(subtype_prompts: Dict[str, str], state_key: str):
+    """
+    All subtypes plus the retain/drop decision in one call, written to the same MTState keys as
+    the Stage-2 agents and cross_reasoning so aggregate_mt_quality applies unchanged. There is no
+    Stage-1 or Stage-3 output in this mode, and subtypes missing from the answer stay unset.
+    """
+    system_prompt = sectioned(EXPRESS_PROMPT, ((subtype, subtype_definition(prompt))
+                                              for subtype, prompt in subtype_prompts.items()))
+    prompt_template = ChatPromptTemplate.from_messages([
+        ("system", system_prompt),
+        ("human", """
+        SOURCE SENTENCE: {source}
+         
+        MACHINE TRANSLATED SENTENCE: {translated}
+         
+        REFERENCE SENTENCE: {reference}
+
+        SUBTYPES TO EVALUATE: {subtypes}
+        """)
+    ])
+
+    def build_inputs(state: MTState) -> Dict[str, Any]:
+        return {
+            "source": state["source"],
+            "translated": state["mt"],
+            "reference": state["reference"],
+            "subtypes": list(subtype_prompts),
+        }
+
+    EXPRESS_PROMPTS[state_key] = (prompt_template, ExpressOutput, build_inputs)
+
+    async def express_agent_fn(state: MTState) -> Dict[str, Any]:
+        output = await run_chain(prompt_template, structured_llm(ExpressOutput), build_inputs(state), state_key,
+                                 ExpressOutput, llm_label())
+
+        updates = {}
+        for verdict in output.verdicts:
+            if verdict.subtype in subtype_prompts and verdict.subtype not in updates:
+                updates[verdict.subtype] = AgentOutputStage2(**verdict.model_dump(exclude={"subtype"}))
+
+        missing = [subtype for subtype in subtype_prompts if subtype not in updates]
+        if missing:
+            print(f"[{state_key}] no verdict for {missing}; they are left out of the aggregation")
+
+        updates["cross_reasoning"] = CrossReasoningOutput(
+            dropped_errors=[e for e in output.dropped_errors if e in subtype_prompts],
+            retained_errors=[e for e in output.retained_errors if e in subtype_prompts],
+            reasoning=output.reasoning,
+        )
+        return updates
+    return express_agent_fn
+
 def final_sync_node(state: MTState):
     return {}
 
@@ -259,6 +428,48 @@ inappropriate_for_context_agent = make_error_agent_stage2(INAPPROPRIATE_FOR_CONT
 inconsistency_use_agent = make_error_agent_stage2(INCONSISTENT_USE_PROMPT, "inconsistency_use", "terminologyStage1")
 awkward_agent = make_error_agent_stage2(AWKWARD_PROMPT, "awkward", "styleStage1")
 
+accuracy_fused_agent = make_fused_agent_stage2({
+    "addition": ADDITION_PROMPT,
+    "omission": OMISSION_PROMPT,
+    "mistranslation": MISTRANSLATION_PROMPT,
+    "untranslated_text": UNTRANSLATED_TEXT_PROMPT,
+    "transliteration": TRANSLITERATION_PROMPT,
+    "non_translation": NON_TRANSLATION_PROMPT,
+}, "accuracyStage2", "accuracyStage1")
+fluency_fused_agent = make_fused_agent_stage2({
+    "punctuation": PUNCTUATION_PROMPT,
+    "spelling": SPELLING_PROMPT,
+    "grammar": GRAMMAR_PROMPT,
+    "register": REGISTER_PROMPT,
+    "inconsistency": INCONSISTENCY_PROMPT,
+    "characterEncoding": CHARACTER_ENCODING_PROMPT,
+}, "fluencyStage2", "fluencyStage1")
+terminology_fused_agent = make_fused_agent_stage2({
+    "inappropriate_for_context": INAPPROPRIATE_FOR_CONTEXT_PROMPT,
+    "inconsistency_use": INCONSISTENT_USE_PROMPT,
+}, "terminologyStage2", "terminologyStage1")
+style_fused_agent = make_fused_agent_stage2({
+    "awkward": AWKWARD_PROMPT,
+}, "styleStage2", "styleStage1")
+
+express_agent = make_express_agent({
+    "addition": ADDITION_PROMPT,
+    "omission": OMISSION_PROMPT,
+    "mistranslation": MISTRANSLATION_PROMPT,
+    "untranslated_text": UNTRANSLATED_TEXT_PROMPT,
+    "transliteration": TRANSLITERATION_PROMPT,
+    "non_translation": NON_TRANSLATION_PROMPT,
+    "punctuation": PUNCTUATION_PROMPT,
+    "spelling": SPELLING_PROMPT,
+    "grammar": GRAMMAR_PROMPT,
+    "register": REGISTER_PROMPT,
+    "inconsistency": INCONSISTENCY_PROMPT,
+    "characterEncoding": CHARACTER_ENCODING_PROMPT,
+    "inappropriate_for_context": INAPPROPRIATE_FOR_CONTEXT_PROMPT,
+    "inconsistency_use": INCONSISTENT_USE_PROMPT,
+    "awkward": AWKWARD_PROMPT,
+}, "express")
+
 accuracy_stage3_agent = make_error_agent_stage3(ACCURACY_STAGE3_PROMPT, "accuracyStage3", "accuracyStage1")
 fluency_stage3_agent = make_error_agent_stage3(FLUENCY_STAGE3_PROMPT, "fluencyStage3", "fluencyStage1")
 terminology_stage3_agent = make_error_agent_stage3(TERMINOLOGY_STAGE3_PROMPT, "terminologyStage3", "terminologyStage1")
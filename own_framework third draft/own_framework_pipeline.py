@@ -4,91 +4,131 @@ from langgraph.graph import START, END
 import json
 import asyncio
 
-graph = StateGraph(MTState)
-
-graph.add_node("accuracyStage1_node", accuracy_agent)
-graph.add_node("fluencyStage1_node", fluency_agent)
-graph.add_node("terminologyStage1_node", terminology_agent)
-graph.add_node("styleStage1_node", style_agent)
-graph.add_node("addition_node", addition_agent)
-graph.add_node("omission_node", omission_agent)
-graph.add_node("mistranslation_node", mistranslation_agent)
-graph.add_node("untranslated_text_node", untranslated_text_agent)
-graph.add_node("transliteration_node", transliteration_agent)
-graph.add_node("non_translation_node", non_translation_agent)
-graph.add_node("punctuation_node", punctuation_agent)
-graph.add_node("spelling_node", spelling_agent)
-graph.add_node("grammar_node", grammar_agent)
-graph.add_node("register_node", register_agent)
-graph.add_node("inconsistency_node", inconsistency_agent)
-graph.add_node("characterEncoding_node", characterEncoding_agent)
-graph.add_node("inappropriate_for_context_node", inappropriate_for_context_agent)
-graph.add_node("inconsistency_use_node", inconsistency_use_agent)
-graph.add_node("awkward_node", awkward_agent)
-graph.add_node("accuracyStage3_node", accuracy_stage3_agent)
-graph.add_node("fluencyStage3_node", fluency_stage3_agent)
-graph.add_node("terminologyStage3_node", terminology_stage3_agent)
-graph.add_node("styleStage3_node", style_stage3_agent)
-graph.add_node("final_sync_node", final_sync_node)
-graph.add_node("cross_reasoning_node", cross_reasoning_node)
-graph.add_node("aggregation_node", aggregate_mt_quality)
-
-# graph.set_entry_point("START")
-
-graph.add_edge(START, "accuracyStage1_node")
-graph.add_edge(START, "fluencyStage1_node")
-graph.add_edge(START, "terminologyStage1_node")
-graph.add_edge(START, "styleStage1_node")
-
-
-graph.add_edge("accuracyStage1_node", "addition_node")
-graph.add_edge("accuracyStage1_node", "omission_node")
-graph.add_edge("accuracyStage1_node", "mistranslation_node")
-graph.add_edge("accuracyStage1_node", "untranslated_text_node")
-graph.add_edge("accuracyStage1_node", "transliteration_node")
-graph.add_edge("accuracyStage1_node", "non_translation_node")
-
-graph.add_edge("fluencyStage1_node", "punctuation_node")
-graph.add_edge("fluencyStage1_node", "spelling_node")
-graph.add_edge("fluencyStage1_node", "grammar_node")
-graph.add_edge("fluencyStage1_node", "register_node")
-graph.add_edge("fluencyStage1_node", "inconsistency_node")
-graph.add_edge("fluencyStage1_node", "characterEncoding_node")
-
-graph.add_edge("terminologyStage1_node", "inappropriate_for_context_node")
-graph.add_edge("terminologyStage1_node", "inconsistency_use_node")
-
-graph.add_edge("styleStage1_node", "awkward_node")
-
-graph.add_edge("addition_node", "accuracyStage3_node")
-graph.add_edge("omission_node", "accuracyStage3_node")
-graph.add_edge("mistranslation_node", "accuracyStage3_node")
-graph.add_edge("untranslated_text_node", "accuracyStage3_node")
-graph.add_edge("transliteration_node", "accuracyStage3_node")
-graph.add_edge("non_translation_node", "accuracyStage3_node")
-
-graph.add_edge("punctuation_node", "fluencyStage3_node")
-graph.add_edge("spelling_node", "fluencyStage3_node")
-graph.add_edge("grammar_node", "fluencyStage3_node")
-graph.add_edge("register_node", "fluencyStage3_node")
-graph.add_edge("inconsistency_node", "fluencyStage3_node")
-graph.add_edge("characterEncoding_node", "fluencyStage3_node")
-
-graph.add_edge("inappropriate_for_context_node", "terminologyStage3_node")
-graph.add_edge("inconsistency_use_node", "terminologyStage3_node")
-
-graph.add_edge("awkward_node", "styleStage3_node")
-
-graph.add_edge("accuracyStage3_node", "final_sync_node")
-graph.add_edge("fluencyStage3_node", "final_sync_node")
-graph.add_edge("terminologyStage3_node", "final_sync_node")
-graph.add_edge("styleStage3_node", "final_sync_node")
-
-graph.add_edge("final_sync_node", "cross_reasoning_node")
-graph.add_edge("cross_reasoning_node", "aggregation_node")
-graph.add_edge("aggregation_node", END)
-
-app = graph.compile()
+PIPELINE_MODES = ("full", "fused", "express")
+
+def build_app(mode="full"):
+    """
+    Compile the evaluation graph. "full" runs one Stage-2 agent per subtype (15 calls);
+    "fused" runs one Stage-2 call per super-category (4 calls) writing the same state keys;
+    "express" skips the staged debate and makes a single call for all subtypes and the
+    retain/drop decision before aggregation.
+    """
+    if mode not in PIPELINE_MODES:
+        raise ValueError(f"unknown pipeline mode {mode!r}, expected one of {PIPELINE_MODES}")
+
+    graph = StateGraph(MTState)
+
+    if mode == "express":
+        graph.add_node("express_node", express_agent)
+        graph.add_node("aggregation_node", aggregate_mt_quality)
+
+        graph.add_edge(START, "express_node")
+        graph.add_edge("express_node", "aggregation_node")
+        graph.add_edge("aggregation_node", END)
+
+        return graph.compile()
+
+    graph.add_node("accuracyStage1_node", accuracy_agent)
+    graph.add_node("fluencyStage1_node", fluency_agent)
+    graph.add_node("terminologyStage1_node", terminology_agent)
+    graph.add_node("styleStage1_node", style_agent)
+    graph.add_node("accuracyStage3_node", accuracy_stage3_agent)
+    graph.add_node("fluencyStage3_node", fluency_stage3_agent)
+    graph.add_node("terminologyStage3_node", terminology_stage3_agent)
+    graph.add_node("styleStage3_node", style_stage3_agent)
+    graph.add_node("final_sync_node", final_sync_node)
+    graph.add_node("cross_reasoning_node", cross_reasoning_node)
+    graph.add_node("aggregation_node", aggregate_mt_quality)
+
+    # graph.set_entry_point("START")
+
+    graph.add_edge(START, "accuracyStage1_node")
+    graph.add_edge(START, "fluencyStage1_node")
+    graph.add_edge(START, "terminologyStage1_node")
+    graph.add_edge(START, "styleStage1_node")
+
+    if mode == "fused":
+        graph.add_node("accuracyStage2_node", accuracy_fused_agent)
+        graph.add_node("fluencyStage2_node", fluency_fused_agent)
+        graph.add_node("terminologyStage2_node", terminology_fused_agent)
+        graph.add_node("styleStage2_node", style_fused_agent)
+
+        graph.add_edge("accuracyStage1_node", "accuracyStage2_node")
+        graph.add_edge("fluencyStage1_node", "fluencyStage2_node")
+        graph.add_edge("terminologyStage1_node", "terminologyStage2_node")
+        graph.add_edge("styleStage1_node", "styleStage2_node")
+
+        graph.add_edge("accuracyStage2_node", "accuracyStage3_node")
+        graph.add_edge("fluencyStage2_node", "fluencyStage3_node")
+        graph.add_edge("terminologyStage2_node", "terminologyStage3_node")
+        graph.add_edge("styleStage2_node", "styleStage3_node")
+    else:
+        graph.add_node("addition_node", addition_agent)
+        graph.add_node("omission_node", omission_agent)
+        graph.add_node("mistranslation_node", mistranslation_agent)
+        graph.add_node("untranslated_text_node", untranslated_text_agent)
+        graph.add_node("transliteration_node", transliteration_agent)
+        graph.add_node("non_translation_node", non_translation_agent)
+        graph.add_node("punctuation_node", punctuation_agent)
+        graph.add_node("spelling_node", spelling_agent)
+        graph.add_node("grammar_node", grammar_agent)
+        graph.add_node("register_node", register_agent)
+        graph.add_node("inconsistency_node", inconsistency_agent)
+        graph.add_node("characterEncoding_node", characterEncoding_agent)
+        graph.add_node("inappropriate_for_context_node", inappropriate_for_context_agent)
+        graph.add_node("inconsistency_use_node", inconsistency_use_agent)
+        graph.add_node("awkward_node", awkward_agent)
+
+        graph.add_edge("accuracyStage1_node", "addition_node")
+        graph.add_edge("accuracyStage1_node", "omission_node")
+        graph.add_edge("accuracyStage1_node", "mistranslation_node")
+        graph.add_edge("accuracyStage1_node", "untranslated_text_node")
+        graph.add_edge("accuracyStage1_node", "transliteration_node")
+        graph.add_edge("accuracyStage1_node", "non_translation_node")
+
+        graph.add_edge("fluencyStage1_node", "punctuation_node")
+        graph.add_edge("fluencyStage1_node", "spelling_node")
+        graph.add_edge("fluencyStage1_node", "grammar_node")
+        graph.add_edge("fluencyStage1_node", "register_node")
+        graph.add_edge("fluencyStage1_node", "inconsistency_node")
+        graph.add_edge("fluencyStage1_node", "characterEncoding_node")
+
+        graph.add_edge("terminologyStage1_node", "inappropriate_for_context_node")
+        graph.add_edge("terminologyStage1_node", "inconsistency_use_node")
+
+        graph.add_edge("styleStage1_node", "awkward_node")
+
+        graph.add_edge("addition_node", "accuracyStage3_node")
+        graph.add_edge("omission_node", "accuracyStage3_node")
+        graph.add_edge("mistranslation_node", "accuracyStage3_node")
+        graph.add_edge("untranslated_text_node", "accuracyStage3_node")
+        graph.add_edge("transliteration_node", "accuracyStage3_node")
+        graph.add_edge("non_translation_node", "accuracyStage3_node")
+
+        graph.add_edge("punctuation_node", "fluencyStage3_node")
+        graph.add_edge("spelling_node", "fluencyStage3_node")
+        graph.add_edge("grammar_node", "fluencyStage3_node")
+        graph.add_edge("register_node", "fluencyStage3_node")
+        graph.add_edge("inconsistency_node", "fluencyStage3_node")
+        graph.add_edge("characterEncoding_node", "fluencyStage3_node")
+
+        graph.add_edge("inappropriate_for_context_node", "terminologyStage3_node")
+        graph.add_edge("inconsistency_use_node", "terminologyStage3_node")
+
+        graph.add_edge("awkward_node", "styleStage3_node")
+
+    graph.add_edge("accuracyStage3_node", "final_sync_node")
+    graph.add_edge("fluencyStage3_node", "final_sync_node")
+    graph.add_edge("terminologyStage3_node", "final_sync_node")
+    graph.add_edge("styleStage3_node", "final_sync_node")
+
+    graph.add_edge("final_sync_node", "cross_reasoning_node")
+    graph.add_edge("cross_reasoning_node", "aggregation_node")
+    graph.add_edge("aggregation_node", END)
+
+    return graph.compile()
+
+app = build_app()
 
 def serialize_state(obj):
     if hasattr(obj, "model_dump"):
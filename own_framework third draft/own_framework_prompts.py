@@ -41,6 +41,48 @@ Rules:
 - Briefly say whether Stage-1 is supported.
 """
 
+STAGE2_FUSED_SHARED = f"""
+You are a careful MT evaluator for SEVERAL subtypes of one super-category.
+Return one verdict per listed subtype, with its subtype name exactly as listed.
+
+{_CALIBRATION_GUIDE}
+{_CONSERVATIVE_RULE}
+
+Rules:
+- Evaluate each subtype independently, as if it were the only one assigned.
+- Do not let evidence for one subtype raise or lower another.
+- Do not trust Stage-1 blindly.
+- Use direct textual evidence.
+- Be conservative when unsure.
+- Re-evaluate probability and confidence per subtype.
+- Briefly say whether Stage-1 is supported, per subtype.
+- Spans are per subtype.
+
+Subtype definitions follow.
+"""
+
+EXPRESS_PROMPT = f"""
+You are an MT evaluator covering the whole error taxonomy in a single pass.
+Return one verdict per listed subtype, with its subtype name exactly as listed,
+then decide which flagged subtypes to retain and which to drop.
+
+{_CALIBRATION_GUIDE}
+{_CONSERVATIVE_RULE}
+
+Rules:
+- Evaluate each subtype independently, using direct textual evidence.
+- There is no previous agent: leave thoughtsOnStage1 empty.
+- Spans are per subtype.
+- Be conservative when unsure.
+
+Retain/drop:
+- If two subtypes describe the same underlying issue, retain the stronger/more specific one.
+- Drop subtypes with weak evidence or that conflict with stronger evidence.
+- retained_errors and dropped_errors must use only the listed subtype names.
+
+Subtype definitions follow.
+"""
+
 STAGE3_SHARED = f"""
 You are a senior verifier.
 
@@ -0,0 +1,165 @@
+import asyncio
+from collections import defaultdict
+from typing import List
+
+from langchain_core.messages import HumanMessage, SystemMessage
+from pydantic import Field, create_model
+
+from chain_runner import invoke_structured
+from cost_ledger import current_row
+from retry_policy import DEFAULT_RETRY_POLICY
+
+
+PACK_INSTRUCTIONS = """
+The input below contains {count} independent SEGMENTS, numbered 0 to {last}.
+Evaluate every segment on its own, exactly as you would if it were the only one, and
+return one output per segment in `outputs`, each with its `segment` number.
+Do not let one segment's content influence another's evaluation.
+"""
+
+_packed_schemas = {}
+
+
+def packed_schema(schema):
+    """Pydantic model for a packed answer: a list of `schema` outputs, each tagged with its segment number."""
+    if schema not in _packed_schemas:
+        segment_output = create_model(
+            f"{schema.__name__}Segment",
+            __base__=schema,
+            segment=(int, Field(..., description="Number of the SEGMENT this output is for.")),
+        )
+        _packed_schemas[schema] = create_model(
+            f"Packed{schema.__name__}",
+            outputs=(List[segment_output], Field(..., description="Exactly one output per SEGMENT.")),
+        )
+    return _packed_schemas[schema]
+
+
+def pack_messages(prompt_template, inputs_list):
+    """
+    One request for several segments of the same node: the node's system prompt once, followed
+    by each segment's rendered human message under a SEGMENT header.
+    """
+    rendered = [prompt_template.format_messages(**inputs) for inputs in inputs_list]
+    system = rendered[0][0].content
+    if any(messages[0].content != system for messages in rendered):
+        raise ValueError("segments of one pack must share the system prompt")
+    segments = "\n\n".join(
+        f"=== SEGMENT {index} ===\n{messages[-1].content}" for index, messages in enumerate(rendered)
+    )
+    instructions = PACK_INSTRUCTIONS.format(count=len(rendered), last=len(rendered) - 1)
+    return [SystemMessage(system + "\n" + instructions), HumanMessage(segments)]
+
+
+def unpack_outputs(packed, schema, count):
+    """Per-segment outputs in segment order, or None if the answer does not cover segments 0..count-1 exactly once."""
+    by_segment = {}
+    for output in packed.outputs:
+        if not 0 <= output.segment < count or output.segment in by_segment:
+            return None
+        by_segment[output.segment] = schema.model_validate(output.model_dump(exclude={"segment"}))
+    if len(by_segment) != count:
+        return None
+    return [by_segment[index] for index in range(count)]
+
+
+def segment_length(state):
+    return len(state["source"]) + len(state["mt"]) + len(state["reference"])
+
+
+class SegmentPacker:
+    """
+    Coalesces concurrent run_chain calls for the same node (from different rows) into packed
+    calls of up to `size` segments. A pack is sent when it is full or `wait` seconds after its
+    first segment arrived. If the packed answer is unusable (parse error, missing or duplicate
+    segments) every segment falls back to its own single call; transient API errors are passed
+    to all rows of the pack so their normal retry handling applies.
+
+    Live packs hold whichever rows reach the node within `wait`, in arrival order; unlike the
+    batch backend they are not sorted by length, since rows arrive one at a time.
+    """
+
+    def __init__(self, size, wait, llm_factory):
+        self.size = size
+        self.wait = wait
+        self.llm_factory = llm_factory
+        self.pending = defaultdict(list)
+        self.packs = 0
+        self.packed_segments = 0
+        self.fallbacks = 0
+        self._llms = {}
+        self._tasks = set()
+
+    def _llm(self, schema):
+        if schema not in self._llms:
+            self._llms[schema] = self.llm_factory(schema)
+        return self._llms[schema]
+
+    async def run(self, node, prompt_template, schema, model, inputs):
+        future = asyncio.get_running_loop().create_future()
+        group = self.pending[node]
+        group.append((inputs, future, current_row.get()))
+        if len(group) >= self.size:
+            self._start(node, prompt_template, schema, model)
+        elif len(group) == 1:
+            asyncio.get_running_loop().call_later(self.wait, self._start_if_waiting, node, group,
+                                                  prompt_template, schema, model)
+        return await future
+
+    def _start_if_waiting(self, node, group, prompt_template, schema, model):
+        if self.pending.get(node) is group:
+            self._start(node, prompt_template, schema, model)
+
+    def _start(self, node, prompt_template, schema, model):
+        group = self.pending.pop(node)
+        task = asyncio.ensure_future(self._flush(node, prompt_template, schema, model, group))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _single(self, node, prompt_template, schema, model, inputs, future, row):
+        current_row.set(row)
+        try:
+            output = await invoke_structured(
+                prompt_template.format_messages(**inputs), self._llm(schema), node, schema, model
+            )
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(output)
+
+    async def _flush(self, node, prompt_template, schema, model, group):
+        group = [(inputs, future, row) for inputs, future, row in group if not future.done()]
+        if not group:
+            return
+        if len(group) == 1:
+            await self._single(node, prompt_template, schema, model, *group[0])
+            return
+
+        outputs = None
+        try:
+            messages = pack_messages(prompt_template, [inputs for inputs, _, _ in group])
+            current_row.set(tuple(row for _, _, row in group))
+            packed = await invoke_structured(messages, self._llm(packed_schema(schema)), node, packed_schema(schema), model)
+            outputs = unpack_outputs(packed, schema, len(group))
+        except Exception as e:
+            if DEFAULT_RETRY_POLICY.is_transient(e):
+                for _, future, _ in group:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            print(f"[{node}] packed call of {len(group)} segments failed ({type(e).__name__}: {e})")
+
+        if outputs is None:
+            self.fallbacks += 1
+            print(f"[{node}] packed answer unusable; evaluating {len(group)} segments one by one")
+            await asyncio.gather(*(self._single(node, prompt_template, schema, model, inputs, future, row)
+                                   for inputs, future, row in group))
+            return
+
+        self.packs += 1
+        self.packed_segments += len(group)
+        for (_, future, _), output in zip(group, outputs):
+            if not future.done():
+                future.set_result(output)
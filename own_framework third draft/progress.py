@@ -0,0 +1,194 @@
+import asyncio
+import json
+import os
+import time
+from collections import defaultdict, deque
+
+from concurrency_controller import percentile
+from http_pool import pool_stats
+from response_cache import response_cache
+
+
+def stage_of(node):
+    if node.endswith("Stage1"):
+        return "stage1"
+    if node.endswith("Stage3"):
+        return "stage3"
+    if node in ("cross_reasoning", "express"):
+        return node
+    return "stage2"
+
+
+class RunStats:
+    """Process-wide counters fed by the LLM call layer and the retry loop."""
+
+    def __init__(self, window=500):
+        self.calls = 0
+        self.retries = 0
+        self.call_retries = 0
+        self.stage_latency = defaultdict(lambda: deque(maxlen=window))
+        self.row_latency = deque(maxlen=window)
+        self.prompt_tokens = defaultdict(int)
+        self.cached_tokens = defaultdict(int)
+
+    def record_call(self, node, seconds):
+        self.calls += 1
+        self.stage_latency[stage_of(node)].append(seconds)
+
+    def record_usage(self, node, usage):
+        """Prompt tokens of one call and how many of them the provider served from its prompt cache."""
+        stage = stage_of(node)
+        self.prompt_tokens[stage] += usage.get("input_tokens") or 0
+        self.cached_tokens[stage] += (usage.get("input_token_details") or {}).get("cache_read") or 0
+
+    def prompt_cache(self):
+        def entry(prompt, cached):
+            return {"prompt_tokens": prompt, "cached_tokens": cached, "cached_share": cached / prompt if prompt else 0.0}
+
+        stages = {stage: entry(self.prompt_tokens[stage], self.cached_tokens[stage]) for stage in sorted(self.prompt_tokens)}
+        stages["total"] = entry(sum(self.prompt_tokens.values()), sum(self.cached_tokens.values()))
+        return stages
+
+    def record_row(self, seconds):
+        self.row_latency.append(seconds)
+
+    def record_retry(self):
+        self.retries += 1
+
+    def record_call_retry(self):
+        self.call_retries += 1
+
+
+run_stats = RunStats()
+
+
+class ProgressReporter:
+    """
+    Periodic progress line and JSON status file for a driver run: rows done, rows/sec over a
+    sliding window, rows in flight, retry rate, per-stage call latency and projected finish time.
+    Work per finished row is a counter bump and a timestamp; everything else happens on the timer.
+    """
+
+    def __init__(self, total=None, status_path=None, interval=10.0, rate_window=60.0, slots=None, metrics=None):
+        self.total = total
+        self.status_path = status_path
+        self.interval = interval
+        self.rate_window = rate_window
+        self.slots = slots
+        self.metrics = metrics
+
+        self.started = time.monotonic()
+        self.done = 0
+        self.failed = 0
+        self.skipped = 0
+        self.finish_times = deque()
+        self._task = None
+
+    def row_finished(self, ok=True):
+        if ok:
+            self.done += 1
+        else:
+            self.failed += 1
+        self.finish_times.append(time.monotonic())
+
+    def row_skipped(self):
+        self.skipped += 1
+
+    def rows_per_sec(self):
+        now = time.monotonic()
+        while self.finish_times and now - self.finish_times[0] > self.rate_window:
+            self.finish_times.popleft()
+        span = min(self.rate_window, now - self.started)
+        return len(self.finish_times) / span if span > 0 else 0.0
+
+    def snapshot(self):
+        rate = self.rows_per_sec()
+        remaining = None
+        eta_seconds = None
+        if self.total is not None:
+            remaining = max(0, self.total - self.done - self.failed - self.skipped)
+            eta_seconds = remaining / rate if rate > 0 else None
+
+        attempts = run_stats.retries + self.done + self.failed
+        status = {
+            "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "elapsed_seconds": time.monotonic() - self.started,
+            "rows_total": self.total,
+            "rows_done": self.done,
+            "rows_failed": self.failed,
+            "rows_skipped": self.skipped,
+            "rows_remaining": remaining,
+            "rows_in_flight": self.slots.active if self.slots is not None else None,
+            "rows_backing_off": self.slots.parked if self.slots is not None else None,
+            "concurrency_limit": self.slots.limit if self.slots is not None else None,
+            "rows_per_sec": rate,
+            "llm_calls": run_stats.calls,
+            "retries": run_stats.retries,
+            "retry_rate": run_stats.retries / attempts if attempts else 0.0,
+            "call_retries": run_stats.call_retries,
+            "stage_latency_seconds": {
+                stage: {"p50": percentile(values, 0.5), "p95": percentile(values, 0.95)}
+                for stage, values in sorted(run_stats.stage_latency.items())
+            },
+            "row_latency_seconds": {
+                "p50": percentile(run_stats.row_latency, 0.5),
+                "p95": percentile(run_stats.row_latency, 0.95),
+                "p99": percentile(run_stats.row_latency, 0.99),
+            },
+            "prompt_cache": run_stats.prompt_cache(),
+            "llm_cache": response_cache.stats() if response_cache is not None else None,
+            "http_pool": pool_stats.snapshot(),
+            "eta_seconds": eta_seconds,
+            "eta_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(time.time() + eta_seconds))
+            if eta_seconds is not None else None,
+        }
+        if self.metrics is not None:
+            status["metrics"] = self.metrics.summary()
+        return status
+
+    def format(self, status):
+        total = status["rows_total"] if status["rows_total"] is not None else "?"
+        eta = status["eta_seconds"]
+        eta_text = f"{eta / 60.0:.1f}min (at {status['eta_at']})" if eta is not None else "n/a"
+        latency = " ".join(
+            f"{stage}={v['p50']:.1f}/{v['p95']:.1f}s" for stage, v in status["stage_latency_seconds"].items()
+        )
+        cache = status["llm_cache"]
+        cache_text = f" | cache hits {cache['hit_rate']:.0%}" if cache and cache["hits"] + cache["misses"] else ""
+        prompt_cache = status["prompt_cache"]["total"]
+        prompt_text = f" | prompt cached {prompt_cache['cached_share']:.0%}" if prompt_cache["prompt_tokens"] else ""
+        pool_wait = status["http_pool"]["pool_wait_seconds"]["p95"]
+        pool_text = f" | pool wait p95 {pool_wait:.2f}s" if status["http_pool"]["requests"] else ""
+        return (
+            f"[progress] {status['rows_done'] + status['rows_failed'] + status['rows_skipped']}/{total} rows "
+            f"(failed {status['rows_failed']}, skipped {status['rows_skipped']}) | "
+            f"{status['rows_per_sec']:.2f} rows/s | in flight {status['rows_in_flight']} "
+            f"(backing off {status['rows_backing_off']}) | retry rate {status['retry_rate']:.1%} | "
+            f"p50/p95 {latency or 'n/a'}{cache_text}{prompt_text}{pool_text} | ETA {eta_text}"
+        )
+
+    def report(self):
+        status = self.snapshot()
+        print(self.format(status), flush=True)
+        if self.status_path:
+            tmp_path = f"{self.status_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(status, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.status_path)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.report()
+
+    async def __aenter__(self):
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self.report()
@@ -0,0 +1,26 @@
+from own_framework_prompts import _CALIBRATION_GUIDE, _CONSERVATIVE_RULE, SPAN_RULES, STAGE2_SHARED
+
+
+# Provider prompt caching (OpenAI, vLLM/llama.cpp prefix caches) reuses the longest previously seen
+# prefix of a request, so every system prompt starts with the blocks it shares with other agents,
+# byte for byte and always in this order, and only then has the agent-specific text. The row data
+# is in the human message, which always comes last.
+STAGE1_STATIC = (_CALIBRATION_GUIDE, _CONSERVATIVE_RULE)
+STAGE2_STATIC = (STAGE2_SHARED, SPAN_RULES)
+
+
+def static_first(prompt, static_blocks):
+    """prompt with each of static_blocks it contains moved to the front, in the given order."""
+    leading = []
+    for block in static_blocks:
+        if block in prompt:
+            prompt = prompt.replace(block, "", 1)
+            leading.append(block)
+    return "".join(leading) + "\n" + prompt.strip() + "\n"
+
+
+def sectioned(shared, sections):
+    """A shared preamble, SPAN_RULES, then one "subtype name: X" section per (name, definition)."""
+    return shared + SPAN_RULES + "\n" + "\n\n".join(
+        f"subtype name: {name}\n{definition}" for name, definition in sections
+    ) + "\n"
@@ -0,0 +1,92 @@
+import asyncio
+import os
+import time
+
+
+class TokenBucket:
+    """
+    Classic token bucket: holds up to `capacity` units and refills at `rate` units per second.
+    take() waits (without blocking the event loop) until the requested amount is available;
+    waiters are served in arrival order so large requests are not starved by small ones.
+    """
+
+    def __init__(self, capacity, rate):
+        self.capacity = float(capacity)
+        self.rate = float(rate)
+        self.level = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = None
+        self._lock_loop = None
+
+    def _get_lock(self):
+        # the limiter is module-level, so bind its lock to whichever loop is running it
+        loop = asyncio.get_running_loop()
+        if self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        return self._lock
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def take(self, amount):
+        amount = min(float(amount), self.capacity)
+        waited = 0.0
+        async with self._get_lock():
+            while True:
+                self._refill()
+                if self.level >= amount:
+                    self.level -= amount
+                    return waited
+                delay = (amount - self.level) / self.rate
+                waited += delay
+                await asyncio.sleep(delay)
+
+    def adjust(self, delta):
+        """Give back (delta < 0 consumed less than reserved) or charge extra units after the fact."""
+        self._refill()
+        self.level = min(self.capacity, self.level - delta)
+
+
+class RateLimiter:
+    """
+    Process-wide pacing of LLM calls against requests-per-minute and tokens-per-minute quotas.
+    Each call reserves one request and its estimated prompt+completion tokens before it is sent;
+    once the response reports real usage, settle() corrects the token bucket by the difference.
+    Buckets hold burst_seconds worth of quota, since providers may enforce limits over windows
+    shorter than a minute. A quota of 0 / None disables that bucket.
+    """
+
+    def __init__(self, rpm=None, tpm=None, burst_seconds=10.0):
+        self.requests = TokenBucket(max(1.0, rpm * burst_seconds / 60.0), rpm / 60.0) if rpm else None
+        self.tokens = TokenBucket(tpm * burst_seconds / 60.0, tpm / 60.0) if tpm else None
+        self.calls = 0
+        self.wait_seconds = 0.0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            rpm=int(os.getenv("OPENAI_RPM_LIMIT", "0") or 0),
+            tpm=int(os.getenv("OPENAI_TPM_LIMIT", "0") or 0),
+            burst_seconds=float(os.getenv("OPENAI_RATE_BURST_SECONDS", "10") or 10),
+        )
+
+    @property
+    def enabled(self):
+        return self.requests is not None or self.tokens is not None
+
+    async def acquire(self, estimated_tokens):
+        self.calls += 1
+        if self.requests is not None:
+            self.wait_seconds += await self.requests.take(1)
+        if self.tokens is not None:
+            self.wait_seconds += await self.tokens.take(estimated_tokens)
+
+    def settle(self, estimated_tokens, actual_tokens):
+        if self.tokens is not None and actual_tokens is not None:
+            self.tokens.adjust(actual_tokens - estimated_tokens)
+
+
+limiter = RateLimiter.from_env()
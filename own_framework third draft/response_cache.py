@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    node TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+"""
+
+
+def cache_key(model, messages, schema):
+    """Content address of one structured call: model label (name and backend), rendered messages and the output JSON schema."""
+    payload = json.dumps(
+        {
+            "model": model,
+            "messages": [[m.type, m.content] for m in messages],
+            "schema": schema.model_json_schema(),
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    On-disk cache of parsed agent outputs in a SQLite file, safe to share between the processes
+    of a sharded or queue-driven run. Total stored bytes are kept under max_bytes by evicting the
+    least recently used entries. Only meaningful for deterministic (temperature=0) calls. The file
+    is created on the first lookup or store, so modules that merely import the cache (merging,
+    --dry-run, --compare-modes) leave no file behind.
+    """
+
+    def __init__(self, path, max_bytes=512 * 1024 * 1024, evict_every=100):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.evict_every = evict_every
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._puts = 0
+        self._ready = False
+
+    @classmethod
+    def from_env(cls):
+        """LLM_CACHE_PATH (empty disables) and LLM_CACHE_MAX_MB configure the process-wide cache."""
+        path = os.getenv("LLM_CACHE_PATH", "llm_response_cache.sqlite")
+        if not path:
+            return None
+        return cls(path, max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", "512") or 512) * 1024 * 1024))
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        if not self._ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._ready = True
+        return conn
+
+    def get(self, key):
+        """Stored JSON for key (marking it recently used), or None."""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+        self.hits += 1
+        return row[0]
+
+    def put(self, key, model, node, value):
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, node, value, size, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, node, value, len(value.encode("utf-8")), time.time()),
+            )
+            self._puts += 1
+            if self._puts % self.evict_every == 0:
+                self._evict(conn)
+
+    def _evict(self, conn):
+        conn.execute("BEGIN IMMEDIATE")
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        excess = total - self.max_bytes
+        if excess > 0:
+            freed = 0
+            victims = []
+            for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_used"):
+                if freed >= excess:
+                    break
+                victims.append((key,))
+                freed += size
+            conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+            self.evictions += len(victims)
+        conn.execute("COMMIT")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        entries = size = 0
+        if self._ready or os.path.exists(self.path):
+            with closing(self._connect()) as conn:
+                entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+        }
+
+
+response_cache = ResponseCache.from_env()
@@ -0,0 +1,144 @@
+import asyncio
+import csv
+import heapq
+import itertools
+import os
+import tempfile
+
+
+def read_csv_header(path, encoding="utf-8-sig"):
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return None
+    with open(path, newline="", encoding=encoding) as f:
+        return next(csv.reader(f), None)
+
+
+def sort_csv_by_row_id(path, encoding="utf-8-sig", run_rows=20_000):
+    """
+    Rewrite a result/failure CSV ordered by row_id with only the last line of each row_id: rows are
+    appended as they finish, and a row re-evaluated on resume (content or prompt changed) is
+    appended again after its stale line. Sorted externally, run_rows lines at a time into temporary
+    runs that are then merged, so memory stays flat however large the file is.
+    """
+    if read_csv_header(path, encoding) is None:
+        return
+    runs = []
+    try:
+        with open(path, newline="", encoding=encoding) as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            id_column = header.index("row_id")
+            lines = enumerate(reader)
+            while True:
+                chunk = sorted((int(row[id_column]), seq, row) for seq, row in itertools.islice(lines, run_rows))
+                if not chunk:
+                    break
+                run = tempfile.TemporaryFile("w+", newline="", encoding="utf-8", dir=os.path.dirname(os.path.abspath(path)))
+                runs.append(run)
+                csv.writer(run, lineterminator="\n").writerows([row_id, seq, *row] for row_id, seq, row in chunk)
+                run.seek(0)
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", newline="", encoding=encoding) as f:
+            writer = csv.writer(f, lineterminator="\n")
+            writer.writerow(header)
+            for _, versions in itertools.groupby(heapq.merge(*(_read_run(run) for run in runs)), key=lambda line: line[0]):
+                *_, latest = versions
+                writer.writerow(latest[2])
+        os.replace(tmp_path, path)
+    finally:
+        for run in runs:
+            run.close()
+
+
+def _read_run(run):
+    for row_id, seq, *row in csv.reader(run):
+        yield int(row_id), int(seq), row
+
+
+class BatchedCsvWriter:
+    """
+    Appends rows to a CSV from a single writer task. Rows are queued by put() and written
+    in one batch every flush_rows rows or flush_interval seconds, whichever comes first.
+    close() drains the queue, flushes and fsyncs the file.
+    """
+
+    def __init__(self, path, flush_rows=50, flush_interval=5.0, encoding="utf-8-sig"):
+        self.path = path
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.encoding = encoding
+        self.rows_written = 0
+
+        self._queue = asyncio.Queue()
+        self._task = None
+        self._file = None
+        self._writer = None
+        self._fieldnames = read_csv_header(path, encoding)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        return self
+
+    async def put(self, row_dict):
+        await self._queue.put(row_dict)
+
+    async def close(self):
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            first = await self._queue.get()
+            if first is None:
+                return
+
+            batch = [first]
+            deadline = loop.time() + self.flush_interval
+            closing = False
+            while len(batch) < self.flush_rows:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if row is None:
+                    closing = True
+                    break
+                batch.append(row)
+
+            await asyncio.to_thread(self._write_batch, batch)
+            if closing:
+                return
+
+    def _write_batch(self, batch):
+        if self._file is None:
+            write_header = self._fieldnames is None
+            if write_header:
+                self._fieldnames = list(batch[0].keys())
+            self._file = open(self.path, "a", newline="", encoding=self.encoding)
+            self._writer = csv.DictWriter(self._file, fieldnames=self._fieldnames, lineterminator="\n")
+            if write_header:
+                self._writer.writeheader()
+
+        self._writer.writerows(batch)
+        self._file.flush()
+        self.rows_written += len(batch)
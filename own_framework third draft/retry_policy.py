@@ -0,0 +1,106 @@
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+
+TRANSIENT_ERROR_NAMES = {"APIConnectionError", "APITimeoutError", "RateLimitError", "InternalServerError"}
+
+TRANSIENT_SIGNALS = [
+    "APIConnectionError",
+    "APITimeoutError",
+    "RateLimitError",
+    "Connection error",
+    "timed out",
+    "timeout",
+    "connection reset",
+    "temporarily unavailable",
+    "502",
+    "503",
+    "504",
+]
+
+TRANSIENT_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+THROTTLE_ERROR_NAMES = {"RateLimitError", "APITimeoutError"}
+
+THROTTLE_SIGNALS = ["rate limit", "429", "timed out", "timeout"]
+
+
+class RetryPolicy:
+    """
+    Decides whether a failure is worth retrying and how long to wait before the next attempt.
+    Backoff is capped exponential with equal jitter; a Retry-After hint from the provider
+    overrides it when present.
+    """
+
+    def __init__(self, max_retries=5, base_delay=2, max_delay=60,
+                 error_names=None, signals=None, status_codes=None):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.error_names = set(TRANSIENT_ERROR_NAMES if error_names is None else error_names)
+        self.signals = [s.lower() for s in (TRANSIENT_SIGNALS if signals is None else signals)]
+        self.status_codes = set(TRANSIENT_STATUS_CODES if status_codes is None else status_codes)
+
+    def is_transient(self, exc):
+        if type(exc).__name__ in self.error_names:
+            return True
+        if status_code_of(exc) in self.status_codes:
+            return True
+        msg = str(exc).lower()
+        return any(signal in msg for signal in self.signals)
+
+    def is_throttle(self, exc):
+        """Rate-limit and timeout failures, i.e. signs that we are sending more than the provider absorbs."""
+        if type(exc).__name__ in THROTTLE_ERROR_NAMES or status_code_of(exc) in {408, 429}:
+            return True
+        msg = str(exc).lower()
+        return any(signal in msg for signal in THROTTLE_SIGNALS)
+
+    def backoff(self, attempt):
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def delay_for(self, attempt, exc=None):
+        hinted = retry_after_of(exc) if exc is not None else None
+        if hinted is not None:
+            return hinted * random.uniform(1.0, 1.2)
+        return self.backoff(attempt)
+
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+
+def status_code_of(exc):
+    code = getattr(exc, "status_code", None)
+    if code is None:
+        response = getattr(exc, "response", None)
+        code = getattr(response, "status_code", None)
+    return code
+
+
+def retry_after_of(exc):
+    """Seconds to wait according to the Retry-After / retry-after-ms headers of an API error, if any."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    ms = headers.get("retry-after-ms")
+    if ms is not None:
+        try:
+            return max(0.0, float(ms) / 1000.0)
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
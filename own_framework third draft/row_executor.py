@@ -0,0 +1,140 @@
+import asyncio
+import contextvars
+
+
+class RowSlots:
+    """
+    Counting gate for rows doing LLM work. Rows sleeping in a retry backoff give their
+    slot back, so a rate-limited row does not hold up the rest of the batch.
+    """
+
+    def __init__(self, limit):
+        if limit < 1:
+            raise ValueError("max_concurrency must be >= 1")
+        self.limit = limit
+        self.active = 0
+        self.parked = 0
+        self.controller = None
+        self._cond = asyncio.Condition()
+
+    async def set_limit(self, limit):
+        async with self._cond:
+            self.limit = limit
+            self._cond.notify_all()
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+
+    async def release(self):
+        async with self._cond:
+            self.active -= 1
+            self._cond.notify_all()
+
+    async def unslotted(self, awaitable):
+        """Await awaitable with the caller's slot given back meanwhile; the slot is re-taken afterwards."""
+        await self.release()
+        reacquired = False
+        try:
+            result = await awaitable
+            await self.acquire()
+            reacquired = True
+            return result
+        except BaseException:
+            if not reacquired:
+                # failed or cancelled while unslotted: keep the caller's release() balanced
+                self.active += 1
+            raise
+
+    async def park(self, delay):
+        self.parked += 1
+        try:
+            await self.unslotted(asyncio.sleep(delay))
+        finally:
+            self.parked -= 1
+
+
+_current_slots = contextvars.ContextVar("row_slots", default=None)
+
+
+async def backoff_sleep(delay):
+    """Sleep for a retry backoff, releasing the caller's row slot (if any) while waiting."""
+    slots = _current_slots.get()
+    if slots is None:
+        await asyncio.sleep(delay)
+    else:
+        await slots.park(delay)
+
+
+async def await_unslotted(awaitable):
+    """Await work done by another row (e.g. a shared duplicate) without holding the caller's row slot."""
+    slots = _current_slots.get()
+    if slots is None:
+        return await awaitable
+    return await slots.unslotted(awaitable)
+
+
+async def report_outcome(latency=None, throttled=False, failed=False):
+    """Feed the result of one graph invocation to the adaptive controller of the caller's run, if any."""
+    slots = _current_slots.get()
+    controller = slots.controller if slots is not None else None
+    if controller is None:
+        return
+    if throttled:
+        await controller.on_throttle()
+    elif failed:
+        await controller.on_error()
+    else:
+        await controller.on_success(latency)
+
+
+async def run_bounded(items, worker, max_concurrency=8, max_pending=None, controller=None, slots=None):
+    """
+    Run worker(item) for every item with at most max_concurrency calls doing work at once.
+    Results are yielded as rows finish (callers that need input order sort afterwards, e.g. by
+    row_id), so one slow or backing-off row never holds up the rest. max_pending caps how many
+    rows are submitted but unfinished, to bound memory on large inputs. With a controller (see
+    concurrency_controller.AimdController) the limit is adjusted during the run from the outcomes
+    passed to report_outcome(). Pass slots to observe the in-flight counts from outside.
+    """
+    slots = slots or RowSlots(max_concurrency)
+    max_pending = max_pending or max_concurrency * 16
+    if controller is not None:
+        slots.controller = controller
+        controller.attach(slots)
+        max_pending = max(max_pending, controller.max_limit * 16)
+    iterator = iter(items)
+    exhausted = False
+
+    async def run_one(item):
+        _current_slots.set(slots)
+        await slots.acquire()
+        try:
+            return await worker(item)
+        finally:
+            await slots.release()
+
+    running = set()
+
+    try:
+        while True:
+            while not exhausted and len(running) < max_pending:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    exhausted = True
+                    break
+                running.add(asyncio.ensure_future(run_one(item)))
+
+            if not running:
+                break
+
+            done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
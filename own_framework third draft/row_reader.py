@@ -0,0 +1,34 @@
+import pandas as pd
+
+
+TEXT_COLUMNS = ["Source", "Translation", "Reference"]
+GOLD_COLUMNS = [f"Error{i}_Type" for i in range(1, 6)]
+
+
+def input_columns(path):
+    """Columns the evaluation needs that are present in the CSV. Raises if a text column is missing."""
+    header = list(pd.read_csv(path, nrows=0).columns)
+    missing = [c for c in TEXT_COLUMNS if c not in header]
+    if missing:
+        raise ValueError(f"{path} is missing required columns: {missing}")
+    return [c for c in header if c in TEXT_COLUMNS or c in GOLD_COLUMNS]
+
+
+def iter_rows(path, chunksize=1000, usecols=None):
+    """
+    Stream (row_id, record) pairs from an MQM CSV without loading the whole file.
+    Only the text and gold-label columns are parsed, as strings, chunksize lines at a time;
+    row_id is the 0-based line position, matching the index pd.read_csv would assign.
+    """
+    usecols = usecols or input_columns(path)
+    row_id = 0
+    for chunk in pd.read_csv(path, usecols=usecols, dtype=str, chunksize=chunksize):
+        for record in chunk.to_dict("records"):
+            yield row_id, record
+            row_id += 1
+
+
+def count_rows(path, chunksize=100_000):
+    """Number of data rows, parsed the same way as iter_rows (quoted newlines included)."""
+    first = pd.read_csv(path, nrows=0).columns[0]
+    return sum(len(chunk) for chunk in pd.read_csv(path, usecols=[first], dtype=str, chunksize=chunksize))
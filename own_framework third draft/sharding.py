@@ -0,0 +1,77 @@
+import json
+import os
+
+import pandas as pd
+
+from metrics import MetricsAccumulator
+
+
+def parse_shard(text):
+    """Parse "i/n" into (i, n) with 0 <= i < n."""
+    try:
+        index, count = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise ValueError(f"shard must look like i/n, got {text!r}")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"shard index must satisfy 0 <= i < n, got {text!r}")
+    return index, count
+
+
+def in_shard(row_id, shard):
+    """Rows are dealt round-robin so every shard gets a similar mix of the corpus."""
+    if shard is None:
+        return True
+    index, count = shard
+    return row_id % count == index
+
+
+def shard_path(path, shard):
+    if shard is None:
+        return path
+    root, ext = os.path.splitext(path)
+    index, count = shard
+    return f"{root}.shard-{index}-of-{count}{ext}"
+
+
+def _read_shards(path, count, warn_missing):
+    frames = []
+    for index in range(count):
+        part = shard_path(path, (index, count))
+        if os.path.exists(part) and os.path.getsize(part) > 0:
+            frames.append(pd.read_csv(part, dtype=str, keep_default_na=False, encoding="utf-8-sig"))
+        elif warn_missing:
+            print(f"[merge] missing shard file: {part}")
+    if not frames:
+        return None
+    merged = pd.concat(frames, ignore_index=True)
+    merged["row_id"] = merged["row_id"].astype(int)
+    return merged.drop_duplicates("row_id", keep="last").sort_values("row_id", kind="stable")
+
+
+def merge_shards(count, output_path, failure_path, summary_path):
+    """
+    Combine the per-shard result and failure CSVs of an i/n run into the single-process files
+    (rows ordered by row_id, latest line per row_id kept) and rebuild the summary from them.
+    Failures are kept only for rows that never produced a result.
+    """
+    metrics = MetricsAccumulator()
+    done_ids = set()
+
+    results = _read_shards(output_path, count, warn_missing=True)
+    if results is not None:
+        results.to_csv(output_path, index=False, encoding="utf-8-sig")
+        done_ids = set(results["row_id"])
+        for gold, top5, hits in results[["gold_errors", "top5_predicted", "hits"]].itertuples(index=False):
+            metrics.add(json.loads(gold), json.loads(top5), json.loads(hits))
+        print(f"[merge] {len(results)} result rows -> {output_path}")
+
+    failures = _read_shards(failure_path, count, warn_missing=False)
+    if failures is not None:
+        failures = failures[~failures["row_id"].isin(done_ids)]
+        failures.to_csv(failure_path, index=False, encoding="utf-8-sig")
+        metrics.rows_failed = len(failures)
+        print(f"[merge] {len(failures)} failed rows -> {failure_path}")
+
+    metrics.write_summary(summary_path)
+    print(f"[merge] summary -> {summary_path}")
+    return metrics
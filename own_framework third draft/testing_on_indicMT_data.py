@@ -1,71 +1,157 @@
 import json
-import pandas as pd
-from collections import Counter
 import os
 import traceback
-import time
-import random
 import asyncio
-
-from own_framework_pipeline import app
-
-async def invoke_with_retries(app, state, row_idx, max_retries=5, base_delay=2, max_delay=60):
+import time
+import argparse
+import glob
+import sys
+import socket
+
+from own_framework_pipeline import app, build_app, PIPELINE_MODES, llm_label
+from model_backends import DEFAULT_MODEL
+import chain_runner
+from aggregation import aggregate_mt_quality
+from row_executor import RowSlots, run_bounded, backoff_sleep, report_outcome
+from progress import ProgressReporter, run_stats
+from concurrency_controller import AimdController, percentile
+from retry_policy import DEFAULT_RETRY_POLICY
+from result_writer import BatchedCsvWriter, read_csv_header, sort_csv_by_row_id
+from row_reader import input_columns, iter_rows, count_rows
+from metrics import MetricsAccumulator
+from sharding import parse_shard, in_shard, shard_path, merge_shards
+from dedup import ResultDeduplicator, triple_key
+from checkpoint import PROMPT_VERSION, row_content_hash, load_completed
+from job_queue import JobQueue, export_queue
+from response_cache import response_cache
+from http_pool import pool_stats
+from cost_ledger import ledger, current_row, merge_ledgers
+
+async def stream_graph(app, state, partial):
+    """Run the graph node by node, keeping every finished node's output in partial."""
+    result = dict(state)
+    async for update in app.astream(state, stream_mode="updates"):
+        for node_output in update.values():
+            if node_output:
+                result.update(node_output)
+        if len(result) >= len(partial):
+            partial.clear()
+            partial.update(result)
+    return result
+
+
+async def invoke_with_retries(app, state, row_idx, policy=DEFAULT_RETRY_POLICY, partial=None):
     """
-    Retry app.invoke(state) for transient failures such as connection/timeouts.
-    Uses exponential backoff with jitter.
+    Retry the graph for transient failures such as connection/timeouts.
+    Backoff follows the retry policy (jittered exponential, honoring Retry-After) and
+    is awaited without holding the row's concurrency slot. partial, if given, receives
+    the node outputs of the most complete attempt so far.
     """
-    last_exception = None
-
-    for attempt in range(1, max_retries + 1):
+    partial = {} if partial is None else partial
+    current_row.set(row_idx)
+    for attempt in range(1, policy.max_retries + 1):
+        started = time.monotonic()
         try:
-            print(f"[row {row_idx}] app.invoke attempt {attempt}/{max_retries}")
-            return await app.ainvoke(state)
+            print(f"[row {row_idx}] app.invoke attempt {attempt}/{policy.max_retries}")
+            result = await stream_graph(app, state, partial)
+            run_stats.record_row(time.monotonic() - started)
+            await report_outcome(latency=time.monotonic() - started)
+            return result
 
         except Exception as e:
-            last_exception = e
             err_name = type(e).__name__
-            err_msg = str(e)
-
-            transient_signals = [
-                "APIConnectionError",
-                "APITimeoutError",
-                "RateLimitError",
-                "Connection error",
-                "timed out",
-                "timeout",
-                "connection reset",
-                "temporarily unavailable",
-                "502",
-                "503",
-                "504",
-            ]
-
-            is_transient = (
-                err_name in {"APIConnectionError", "APITimeoutError", "RateLimitError"}
-                or any(signal.lower() in err_msg.lower() for signal in transient_signals)
-            )
-
-            print(f"[row {row_idx}] attempt {attempt} failed: {err_name}: {err_msg}")
-
-            if not is_transient:
+            print(f"[row {row_idx}] attempt {attempt} failed: {err_name}: {e}")
+            await report_outcome(throttled=policy.is_throttle(e), failed=True)
+
+            if not policy.is_transient(e):
                 print(f"[row {row_idx}] non-transient error, not retrying.")
                 raise
 
-            if attempt == max_retries:
+            if attempt == policy.max_retries:
                 print(f"[row {row_idx}] exhausted retries.")
                 raise
 
-            sleep_time = min(max_delay, base_delay * (2 ** (attempt - 1))) + random.uniform(0, 1)
+            run_stats.record_retry()
+            sleep_time = policy.delay_for(attempt, e)
             print(f"[row {row_idx}] transient error, retrying in {sleep_time:.2f}s...")
-            time.sleep(sleep_time)
+            await backoff_sleep(sleep_time)
+
+
+async def invoke_with_deadline(app, state, row_idx, deadline):
+    """
+    invoke_with_retries under a wall-clock budget of deadline seconds for the whole row.
+    When it expires the in-flight node calls are cancelled and the nodes that already
+    finished are aggregated into a result marked degraded. A row with no Stage-2 output
+    by then still fails.
+    """
+    if not deadline:
+        return await invoke_with_retries(app, state, row_idx)
 
-    raise last_exception
+    partial = {}
+    try:
+        async with asyncio.timeout(deadline) as budget:
+            return await invoke_with_retries(app, state, row_idx, partial=partial)
+    except TimeoutError:
+        if not budget.expired():
+            raise
+
+    if not any(partial.get(key) is not None for key in MODEL_ERROR_KEYS):
+        raise TimeoutError(f"row {row_idx} reached its {deadline}s deadline before any subtype agent finished")
+
+    result = {**state, **partial}
+    result.update(aggregate_mt_quality(result))
+    result["degraded"] = True
+    result["missing_nodes"] = [key for key in GRAPH_OUTPUT_KEYS if partial.get(key) is None]
+    print(f"[row {row_idx}] deadline of {deadline}s reached, degraded result without {result['missing_nodes']}")
+    return result
 
 
 CSV_PATH = "Hindi_Indic_MQM_MT_data_Own_Cat_Map - All_Original.csv"
 OUTPUT_PATH = "top5_error_match_results.csv"
 SUMMARY_PATH = "top5_error_match_summary.json"
+COST_LEDGER_PATH = "top5_error_match_cost_ledger.json"
 FAILURE_PATH = "top5_error_match_failures.csv"
+DRY_RUN_PATH = "top5_error_match_dry_run.json"
+STATUS_PATH = "top5_error_match_status.json"
+PROGRESS_INTERVAL = 10.0
+MAX_CONCURRENCY = 8
+ADAPTIVE_CONCURRENCY = False
+ADAPTIVE_MAX_CONCURRENCY = 64
+ADAPTIVE_P95_TARGET = None
+RESUME = True
+FLUSH_ROWS = 50
+FLUSH_SECONDS = 5.0
+READ_CHUNK_ROWS = 1000
+DEDUP_TRIPLES = True
+DEDUP_MAX_ENTRIES = 200_000
+ROW_DEADLINE_SECONDS = 600
+# "full": one Stage-2 agent per subtype; "fused": one Stage-2 call per super-category;
+# "express": one call per row for all subtypes and the retain/drop decision.
+# Non-full modes write their own result files (see mode_path) so runs can be compared.
+PIPELINE_MODE = "full"
+METRICS_EVERY = 100
+# Lease must outlast ROW_DEADLINE_SECONDS; workers renew it every QUEUE_LEASE_SECONDS / 3 anyway.
+QUEUE_LEASE_SECONDS = 900
+QUEUE_MAX_ATTEMPTS = 3
+QUEUE_POLL_SECONDS = 5.0
+BATCH_WORKDIR = "batch_work"
+BATCH_POLL_SECONDS = 60.0
+# Segments (rows) evaluated per agent call; 1 disables packing. Live runs wait up to
+# PACK_WAIT_SECONDS for other rows to reach the same node before sending a partial pack.
+PACK_SEGMENTS = 1
+PACK_WAIT_SECONDS = 0.25
+# Cheap first model for --cascade; answers with a probability inside CASCADE_BAND or a
+# confidence below CASCADE_MIN_CONFIDENCE are re-run on the main model.
+CASCADE = False
+CASCADE_BACKEND = "openai"
+CASCADE_MODEL = "gpt-4.1-nano"
+CASCADE_BAND = (0.2, 0.8)
+CASCADE_MIN_CONFIDENCE = 60.0
+# --hedge: duplicate a call still running after the HEDGE_QUANTILE latency of its stage,
+# with duplicates capped at HEDGE_MAX_EXTRA of all calls.
+HEDGE = False
+HEDGE_QUANTILE = 0.95
+HEDGE_MAX_EXTRA = 0.05
 
 MODEL_ERROR_KEYS = [
     "addition", "omission", "mistranslation", "untranslated_text", "transliteration", "non_translation",
@@ -90,6 +176,21 @@ GOLD_TO_MODEL = {
 
 IGNORE_GOLD = {"Default", "Other", "Source_error"}
 
+RESULT_COLUMNS = [
+    "row_id", "content_hash", "Source", "Reference", "Translation",
+    "gold_errors", "top5_predicted", "hits", "num_gold", "num_hits",
+    "recall_at_5", "precision_at_5", "exact_match", "exact_containment",
+    "degraded", "missing_nodes", "all_scores_json",
+]
+
+GRAPH_OUTPUT_KEYS = (
+    ["accuracyStage1", "fluencyStage1", "terminologyStage1", "styleStage1"]
+    + MODEL_ERROR_KEYS
+    + ["accuracyStage3", "fluencyStage3", "terminologyStage3", "styleStage3", "cross_reasoning"]
+)
+
+deduplicator = ResultDeduplicator(DEDUP_MAX_ENTRIES) if DEDUP_TRIPLES else None
+
 
 def log(msg):
     print(msg, flush=True)
@@ -109,7 +210,7 @@ def get_gold_errors(row):
     gold = []
     for i in range(1, 6):
         col = f"Error{i}_Type"
-        if col not in row.index:
+        if col not in row:
             continue
         label = str(row[col]).strip()
         if label in IGNORE_GOLD:
@@ -169,6 +270,8 @@ def evaluate_row(row, result):
         "precision_at_5": precision_at_5,
         "exact_match": exact_match,
         "exact_containment": exact_containment,
+        "degraded": bool(result.get("degraded", False)),
+        "missing_nodes": result.get("missing_nodes", []),
         "all_scores_json": json.dumps(
             [{"error": k, "score": s, "prob": p, "conf": c} for (k, s, p, c) in all_scored],
             ensure_ascii=False
@@ -176,17 +279,167 @@ def evaluate_row(row, result):
     }
 
 
-def append_csv_row(path, row_dict, write_header):
-    pd.DataFrame([row_dict]).to_csv(
-        path,
-        mode="a",
-        header=write_header,
-        index=False,
-        encoding="utf-8-sig"
-    )
+def build_state(row):
+    return {
+        "source": str(row["Source"]),
+        "mt": str(row["Translation"]),
+        "reference": str(row["Reference"]),
+        "accuracyStage1_round": 0,
+        "fluencyStage1_round": 0,
+        "terminologyStage1_round": 0,
+        "styleStage1_round": 0
+    }
+
+
+def pipeline_version():
+    """
+    Prompt version plus pipeline mode, model and backend, cascade and packing, so resume
+    re-evaluates rows finished under other settings.
+    """
+    version = PROMPT_VERSION if PIPELINE_MODE == "full" else f"{PROMPT_VERSION}+{PIPELINE_MODE}"
+    label = llm_label()
+    if label != DEFAULT_MODEL:
+        version = f"{version}+{label}"
+    if CASCADE:
+        version = (f"{version}+cascade:{chain_runner.cascade.cheap_label}:{CASCADE_BAND[0]}-{CASCADE_BAND[1]}:"
+                   f"{CASCADE_MIN_CONFIDENCE}")
+    return version if PACK_SEGMENTS <= 1 else f"{version}+pack{PACK_SEGMENTS}"
+
+
+def mode_path(path, mode=None):
+    mode = mode or PIPELINE_MODE
+    if mode == "full":
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{mode}{ext}"
+
+
+def content_hash_of(row):
+    return row_content_hash(row["Source"], row["Translation"], row["Reference"], pipeline_version())
+
+
+def run_throughput(progress):
+    """
+    Calls and speed of the rows this run evaluated, for its summary. Calls answered by the response
+    cache are counted apart, since they cost nothing and take no time.
+    """
+    evaluated = progress.done + progress.failed
+    cache_hits = response_cache.hits if response_cache is not None else 0
+    elapsed = time.monotonic() - progress.started
+    return {
+        "rows_evaluated": evaluated,
+        "llm_calls": run_stats.calls,
+        "cache_hits": cache_hits,
+        "elapsed_seconds": elapsed,
+        "calls_per_row": (run_stats.calls + cache_hits) / evaluated,
+        "cached_share": cache_hits / (run_stats.calls + cache_hits) if run_stats.calls + cache_hits else 0.0,
+        "rows_per_sec": evaluated / elapsed if elapsed else None,
+    }
+
+
+def previous_throughput(summary_path):
+    if not os.path.exists(summary_path):
+        return None
+    with open(summary_path, encoding="utf-8") as f:
+        return json.load(f).get("throughput")
+
+
+def write_cost_ledger(path):
+    """Write this process's cost ledger and log the most expensive nodes."""
+    if not ledger.nodes:
+        return
+    ledger.write(path)
+    totals = ledger.totals()
+    log(f"Cost: ${totals['dollars']:.4f} for {totals['calls']} calls, {totals['prompt_tokens']} prompt "
+        f"({totals['cached_tokens']} cached) + {totals['completion_tokens']} completion tokens")
+    for entry in ledger.ranking()[:5]:
+        log(f"  {entry['node']:<28} ${entry['dollars']:.4f} ({entry['share']:.1%}) | "
+            f"{entry['prompt_tokens']} prompt / {entry['completion_tokens']} completion tokens")
+    if ledger.unpriced_models:
+        log(f"  no price for {', '.join(sorted(ledger.unpriced_models))}; counted as $0 (see cost_ledger.MODEL_PRICES)")
+    log(f"Cost ledger saved to: {os.path.abspath(path)}")
+
+
+def worker_ledger_path(worker_id):
+    root, ext = os.path.splitext(mode_path(COST_LEDGER_PATH))
+    return f"{root}.worker-{worker_id.replace(':', '-').replace(os.sep, '-')}{ext}"
 
 
-async def main():
+def build_result_row(idx, row, eval_out):
+    return {
+        "row_id": idx,
+        "content_hash": content_hash_of(row),
+        "Source": row["Source"],
+        "Reference": row["Reference"],
+        "Translation": row["Translation"],
+        "gold_errors": json.dumps(eval_out["gold_errors"], ensure_ascii=False),
+        "top5_predicted": json.dumps(eval_out["top5_predicted"], ensure_ascii=False),
+        "hits": json.dumps(eval_out["hits"], ensure_ascii=False),
+        "num_gold": eval_out["num_gold"],
+        "num_hits": eval_out["num_hits"],
+        "recall_at_5": eval_out["recall_at_5"],
+        "precision_at_5": eval_out["precision_at_5"],
+        "exact_match": eval_out["exact_match"],
+        "exact_containment": eval_out["exact_containment"],
+        "degraded": eval_out["degraded"],
+        "missing_nodes": json.dumps(eval_out["missing_nodes"], ensure_ascii=False),
+        "all_scores_json": eval_out["all_scores_json"],
+    }
+
+
+def compact_result(result):
+    """Keep only what get_top5_predictions reads, so deduplicated results stay small in memory."""
+    compact = {
+        key: {
+            "reEvaluatedProb": result[key].get("reEvaluatedProb", 0.0),
+            "reEvaluatedConfidence": result[key].get("reEvaluatedConfidence", 0.0),
+        }
+        for key in MODEL_ERROR_KEYS
+        if result.get(key) is not None
+    }
+    cross = result.get("cross_reasoning")
+    compact["cross_reasoning"] = {"retained_errors": cross.get("retained_errors", [])} if cross else None
+    compact["degraded"] = result.get("degraded", False)
+    compact["missing_nodes"] = result.get("missing_nodes", [])
+    return compact
+
+
+async def run_pipeline(state, idx):
+    log(f"Calling app.invoke for row {idx} ...")
+    result = await invoke_with_deadline(app, state, idx, ROW_DEADLINE_SECONDS)
+    log(f"app.invoke finished for row {idx}")
+    return compact_result(serialize(result))
+
+
+async def evaluate_one(item):
+    idx, row = item
+    log(f"\nStarting row {idx}")
+
+    try:
+        state = build_state(row)
+
+        if deduplicator is not None:
+            key = triple_key(row["Source"], row["Translation"], row["Reference"])
+            result = await deduplicator.run(key, lambda: run_pipeline(state, idx))
+        else:
+            result = await run_pipeline(state, idx)
+
+        eval_out = evaluate_row(row, result)
+        return idx, eval_out, build_result_row(idx, row, eval_out), None
+
+    except Exception as e:
+        log(f"FAILED row {idx}: {e}")
+        log(traceback.format_exc())
+
+        fail_row = {
+            "row_id": idx,
+            "error": str(e),
+            "traceback": traceback.format_exc(),
+        }
+        return idx, None, None, fail_row
+
+
+async def main(shard=None, max_concurrency=MAX_CONCURRENCY, resume=RESUME, adaptive=ADAPTIVE_CONCURRENCY):
     log("Script started")
     log(f"Current working directory: {os.getcwd()}")
     log(f"Looking for CSV at: {os.path.abspath(CSV_PATH)}")
@@ -196,111 +449,501 @@ async def main():
         return
 
     try:
-        df = pd.read_csv(CSV_PATH)
+        usecols = input_columns(CSV_PATH)
     except Exception as e:
         log(f"ERROR while reading CSV: {e}")
         log(traceback.format_exc())
         return
 
-    log(f"CSV loaded successfully. Rows: {len(df)}")
-    log(f"Results will be written to: {os.path.abspath(OUTPUT_PATH)}")
-    log(f"Failures will be written to: {os.path.abspath(FAILURE_PATH)}")
+    output_path = shard_path(mode_path(OUTPUT_PATH), shard)
+    failure_path = shard_path(mode_path(FAILURE_PATH), shard)
+    summary_path = shard_path(mode_path(SUMMARY_PATH), shard)
+    status_path = shard_path(mode_path(STATUS_PATH), shard)
+
+    log(f"Pipeline mode: {PIPELINE_MODE}")
+    log(f"Model backend: {os.getenv('LLM_BACKEND', 'openai')} ({llm_label()})")
+    if shard is not None:
+        log(f"Running shard {shard[0]}/{shard[1]}")
+    log(f"Streaming columns {usecols} in chunks of {READ_CHUNK_ROWS} rows")
+    log(f"Results will be written to: {os.path.abspath(output_path)}")
+    log(f"Failures will be written to: {os.path.abspath(failure_path)}")
+
+    metrics = MetricsAccumulator()
+    # a run that evaluates nothing (all rows resumed) keeps the throughput of the run that did
+    metrics.throughput = previous_throughput(summary_path)
+
+    rows_total = count_rows(CSV_PATH)
+    if shard is not None:
+        rows_total = len(range(shard[0], rows_total, shard[1]))
+    log(f"Rows to cover: {rows_total}")
+
+    completed = {}
+    existing_header = read_csv_header(output_path)
+    if existing_header is not None:
+        if existing_header != RESULT_COLUMNS:
+            log(f"ERROR: {output_path} was written by an older version with columns {existing_header}. "
+                "Move it aside before starting a new run.")
+            return
+        if resume:
+            completed = load_completed(output_path)
+            log(f"Resume mode: {len(completed)} rows already in {output_path} (prompt version {pipeline_version()})")
+
+    skipped = 0
+
+    def pending_rows():
+        nonlocal skipped
+        for idx, row in iter_rows(CSV_PATH, READ_CHUNK_ROWS, usecols):
+            if not in_shard(idx, shard):
+                continue
+            done = completed.get(idx)
+            if done is not None and done["content_hash"] == content_hash_of(row):
+                skipped += 1
+                progress.row_skipped()
+                metrics.add(done["gold_errors"], done["top5_predicted"], done["hits"])
+                continue
+            yield idx, row
+
+    controller = None
+    if adaptive:
+        controller = AimdController(
+            initial=max_concurrency,
+            max_limit=ADAPTIVE_MAX_CONCURRENCY,
+            latency_target=ADAPTIVE_P95_TARGET,
+        )
+        log(f"Adaptive concurrency: starting at {controller.limit}, max {controller.max_limit}")
+    else:
+        log(f"Evaluating with up to {max_concurrency} rows in flight")
+
+    results_writer = BatchedCsvWriter(output_path, FLUSH_ROWS, FLUSH_SECONDS)
+    failures_writer = BatchedCsvWriter(failure_path, FLUSH_ROWS, FLUSH_SECONDS)
+    slots = RowSlots(max_concurrency)
+    progress = ProgressReporter(rows_total, status_path, PROGRESS_INTERVAL, slots=slots, metrics=metrics)
+
+    async with results_writer, failures_writer, progress:
+        async for idx, eval_out, row_dict, fail_row in run_bounded(
+            pending_rows(), evaluate_one, max_concurrency, controller=controller, slots=slots
+        ):
+            if fail_row is not None:
+                metrics.add_failure()
+                progress.row_finished(ok=False)
+                await failures_writer.put(fail_row)
+            else:
+                metrics.add(eval_out["gold_errors"], eval_out["top5_predicted"], eval_out["hits"])
+                progress.row_finished()
+                await results_writer.put(row_dict)
+                log(f"Finished row {idx}")
+
+            if (metrics.rows_total + metrics.rows_failed) % METRICS_EVERY == 0:
+                log(f"[metrics] {metrics.status_line()}")
+                metrics.write_summary(summary_path)
+
+    # rows are written as they finish; put them back in input order
+    sort_csv_by_row_id(output_path)
+    sort_csv_by_row_id(failure_path)
+
+    if controller is not None:
+        log(f"Adaptive concurrency finished at {controller.limit} "
+            f"({controller.increases} increases, {controller.decreases} decreases)")
+
+    if deduplicator is not None and deduplicator.hits:
+        log(f"Deduplicated {deduplicator.hits} rows onto {deduplicator.misses} unique triples")
+
+    if response_cache is not None:
+        cache = response_cache.stats()
+        log(f"LLM response cache: {cache['hits']} hits, {cache['misses']} misses ({cache['hit_rate']:.1%}), "
+            f"{cache['entries']} entries / {cache['bytes'] / 1e6:.1f} MB in {response_cache.path}")
+
+    prompt_cache = run_stats.prompt_cache()
+    if prompt_cache["total"]["prompt_tokens"]:
+        log("Provider prompt cache: " + ", ".join(
+            f"{stage} {entry['cached_tokens']}/{entry['prompt_tokens']} ({entry['cached_share']:.1%})"
+            for stage, entry in prompt_cache.items()
+        ) + " prompt tokens cached")
+
+    pool = pool_stats.snapshot()
+    if pool["requests"]:
+        log(f"HTTP pool: {pool['requests']} requests over {pool['new_connections']} new connections | "
+            f"pool wait p50/p95 {pool['pool_wait_seconds']['p50']:.3f}/{pool['pool_wait_seconds']['p95']:.3f}s | "
+            f"per-host wait p95 {pool['host_wait_seconds']['p95']:.3f}s | "
+            f"connect p95 {pool['connect_seconds']['p95']:.3f}s")
+
+    hedger = chain_runner.hedger
+    if hedger is not None:
+        hedging = hedger.stats()
+        log(f"Hedging: {hedging['hedges']} duplicate calls for {hedging['calls']} calls "
+            f"({hedging['extra_rate']:.1%} extra), {hedging['hedge_wins']} answered first, "
+            f"{hedging['over_budget']} slow calls over the budget")
+    rows = run_stats.row_latency
+    if rows:
+        log(f"Row latency p50/p95/p99: {percentile(rows, 0.5):.1f}/{percentile(rows, 0.95):.1f}/"
+            f"{percentile(rows, 0.99):.1f}s")
+
+    cascade = chain_runner.cascade
+    if cascade is not None:
+        for node, counts in cascade.report().items():
+            if counts["cheap_calls"]:
+                log(f"Cascade {node}: {counts['escalated']}/{counts['cheap_calls']} escalated "
+                    f"({counts['escalation_rate']:.1%})")
+            else:
+                log(f"Cascade {node}: {counts['direct']} calls on the main model (nothing to gate on)")
+
+    packer = chain_runner.packer
+    if packer is not None:
+        log(f"Packing: {packer.packed_segments} segments sent in {packer.packs} packed calls, "
+            f"{packer.fallbacks} packs fell back to single calls")
+
+    if skipped:
+        log(f"Skipped {skipped} rows already completed with the same content and prompt version")
+
+    if progress.done + progress.failed:
+        metrics.throughput = run_throughput(progress)
+
+    write_cost_ledger(shard_path(mode_path(COST_LEDGER_PATH), shard))
 
-    per_error_total = Counter()
-    per_error_hit = Counter()
+    try:
+        metrics.write_summary(summary_path)
+        log(f"\n[metrics] {metrics.status_line()}")
+        log(f"Summary saved to: {os.path.abspath(summary_path)}")
+    except Exception as e:
+        log(f"Could not create summary: {e}")
+        log(traceback.format_exc())
 
-    write_header_results = not os.path.exists(OUTPUT_PATH)
-    write_header_failures = not os.path.exists(FAILURE_PATH)
+    log("Script finished")
 
-    for idx, row in df.iterrows():
-        log(f"\nStarting row {idx}")
 
+async def queue_worker(queue_path, max_concurrency=MAX_CONCURRENCY, worker_id=None):
+    """
+    Pull rows from the job queue at queue_path until none are pending or leased, keeping up to
+    max_concurrency rows in flight. Any number of these can run against the same queue, on this
+    machine or others sharing a filesystem with working POSIX locks (see JobQueue); use
+    --queue-export afterwards to write the CSVs.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    queue = JobQueue(queue_path)
+
+    if os.path.exists(CSV_PATH):
+        added = await asyncio.to_thread(
+            queue.populate,
+            ((idx, content_hash_of(row), row) for idx, row in iter_rows(CSV_PATH, READ_CHUNK_ROWS)),
+        )
+        log(f"[queue] {added} rows (re)queued from {CSV_PATH}")
+    log(f"[queue] worker {worker_id} on {os.path.abspath(queue_path)}: {queue.counts()}")
+
+    held = set()
+    running = set()
+    progress = ProgressReporter(None, None, PROGRESS_INTERVAL)
+
+    async def process(idx, row):
         try:
-            state = {
-                "source": str(row["Source"]),
-                "mt": str(row["Translation"]),
-                "reference": str(row["Reference"]),
-                "accuracyStage1_round": 0,
-                "fluencyStage1_round": 0,
-                "terminologyStage1_round": 0,
-                "styleStage1_round": 0
-            }
-
-            log(f"Calling app.invoke for row {idx} ...")
-            result = invoke_with_retries(app, state, idx)
-            log(f"app.invoke finished for row {idx}")
-
-            result = serialize(result)
-            eval_out = evaluate_row(row, result)
-
-            for g in eval_out["gold_errors"]:
-                per_error_total[g] += 1
-            for h in eval_out["hits"]:
-                per_error_hit[h] += 1
-
-            row_dict = {
-                "row_id": idx,
-                "Source": row["Source"],
-                "Reference": row["Reference"],
-                "Translation": row["Translation"],
-                "gold_errors": json.dumps(eval_out["gold_errors"], ensure_ascii=False),
-                "top5_predicted": json.dumps(eval_out["top5_predicted"], ensure_ascii=False),
-                "hits": json.dumps(eval_out["hits"], ensure_ascii=False),
-                "num_gold": eval_out["num_gold"],
-                "num_hits": eval_out["num_hits"],
-                "recall_at_5": eval_out["recall_at_5"],
-                "precision_at_5": eval_out["precision_at_5"],
-                "exact_match": eval_out["exact_match"],
-                "exact_containment": eval_out["exact_containment"],
-                "all_scores_json": eval_out["all_scores_json"],
-            }
-
-            append_csv_row(OUTPUT_PATH, row_dict, write_header_results)
-            write_header_results = False
-
-            log(f"Saved row {idx}")
-
-        except Exception as e:
-            log(f"FAILED row {idx}: {e}")
-            log(traceback.format_exc())
-
-            fail_row = {
-                "row_id": idx,
-                "error": str(e),
-                "traceback": traceback.format_exc(),
-            }
-            append_csv_row(FAILURE_PATH, fail_row, write_header_failures)
-            write_header_failures = False
-
-    if os.path.exists(OUTPUT_PATH):
+            idx, eval_out, row_dict, fail_row = await evaluate_one((idx, row))
+            if fail_row is not None:
+                await asyncio.to_thread(queue.fail, worker_id, idx, fail_row, QUEUE_MAX_ATTEMPTS)
+                progress.row_finished(ok=False)
+            elif await asyncio.to_thread(queue.complete, worker_id, idx, row_dict):
+                progress.row_finished()
+                log(f"Finished row {idx}")
+            else:
+                log(f"[queue] lease on row {idx} was lost; result discarded")
+        finally:
+            held.discard(idx)
+
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(QUEUE_LEASE_SECONDS / 3)
+            if held:
+                await asyncio.to_thread(queue.renew, worker_id, list(held), QUEUE_LEASE_SECONDS)
+
+    async with progress:
+        renewer = asyncio.create_task(heartbeat())
         try:
-            out_df = pd.read_csv(OUTPUT_PATH)
-            valid = out_df[out_df["num_gold"] > 0]
-
-            summary = {
-                "rows_total": int(len(out_df)),
-                "rows_with_gold_errors": int(len(valid)),
-                "hit_at_5": float((valid["num_hits"] > 0).mean()) if len(valid) else None,
-                "mean_recall_at_5": float(valid["recall_at_5"].mean()) if len(valid) else None,
-                "mean_precision_at_5": float(valid["precision_at_5"].mean()) if len(valid) else None,
-                "exact_match_rate": float(valid["exact_match"].mean()) if len(valid) else None,
-                "exact_containment_rate": float(valid["exact_containment"].mean()) if len(valid) else None,
-                "per_error_recall": {
-                    err: (per_error_hit[err] / per_error_total[err]) if per_error_total[err] else None
-                    for err in sorted(per_error_total)
-                }
-            }
-
-            with open(SUMMARY_PATH, "w", encoding="utf-8") as f:
-                json.dump(summary, f, indent=2, ensure_ascii=False)
-
-            log(f"\nSummary saved to: {os.path.abspath(SUMMARY_PATH)}")
-        except Exception as e:
-            log(f"Could not create summary: {e}")
-            log(traceback.format_exc())
+            while True:
+                jobs = await asyncio.to_thread(
+                    queue.lease, worker_id, max_concurrency - len(running), QUEUE_LEASE_SECONDS
+                )
+                for idx, row in jobs:
+                    held.add(idx)
+                    running.add(asyncio.create_task(process(idx, row)))
+
+                if not running:
+                    if not await asyncio.to_thread(queue.has_open_jobs):
+                        break
+                    # other workers hold the remaining leases; wait in case any of them expire
+                    await asyncio.sleep(QUEUE_POLL_SECONDS)
+                    continue
+
+                done, running = await asyncio.wait(
+                    running, timeout=QUEUE_POLL_SECONDS, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    task.result()
+        finally:
+            renewer.cancel()
+            for task in running:
+                task.cancel()
+            await asyncio.gather(renewer, *running, return_exceptions=True)
+
+    log(f"[queue] worker {worker_id} done: {queue.counts()}")
+    write_cost_ledger(worker_ledger_path(worker_id))
+
+
+async def batch_main(client, shard=None, resume=RESUME, workdir=BATCH_WORKDIR, poll_interval=BATCH_POLL_SECONDS):
+    """
+    Evaluate the CSV through a Batch-API client (see batch_runner) instead of live calls: every stage
+    is sent for all pending rows at once, one stage after another. Unique triples are submitted once.
+    Output files are the same as main()'s.
+    """
+    from batch_runner import BatchRun
 
-    log("Script finished")
+    if PIPELINE_MODE != "full":
+        log(f"ERROR: the batch backend runs the full pipeline only, not {PIPELINE_MODE!r}")
+        return
+
+    output_path = shard_path(OUTPUT_PATH, shard)
+    failure_path = shard_path(FAILURE_PATH, shard)
+    summary_path = shard_path(SUMMARY_PATH, shard)
+    workdir = shard_path(workdir, shard)
+
+    completed = {}
+    existing_header = read_csv_header(output_path)
+    if existing_header is not None:
+        if existing_header != RESULT_COLUMNS:
+            log(f"ERROR: {output_path} was written by an older version with columns {existing_header}. "
+                "Move it aside before starting a new run.")
+            return
+        if resume:
+            completed = load_completed(output_path)
+
+    metrics = MetricsAccumulator()
+    pending = []
+    states = {}
+    for idx, row in iter_rows(CSV_PATH, READ_CHUNK_ROWS):
+        if not in_shard(idx, shard):
+            continue
+        done = completed.get(idx)
+        if done is not None and done["content_hash"] == content_hash_of(row):
+            metrics.add(done["gold_errors"], done["top5_predicted"], done["hits"])
+            continue
+        key = triple_key(row["Source"], row["Translation"], row["Reference"])
+        states.setdefault(key, build_state(row))
+        pending.append((idx, key, row))
+    log(f"Batch run: {len(pending)} rows pending, {len(states)} unique triples, "
+        f"{metrics.rows_total} already completed")
+
+    results, errors = await BatchRun(client, workdir, poll_interval, pack_size=PACK_SEGMENTS, log=log).run(states)
+
+    async with BatchedCsvWriter(output_path, FLUSH_ROWS, FLUSH_SECONDS) as results_writer, \
+            BatchedCsvWriter(failure_path, FLUSH_ROWS, FLUSH_SECONDS) as failures_writer:
+        for idx, key, row in pending:
+            if key not in results:
+                metrics.add_failure()
+                await failures_writer.put({"row_id": idx, "error": errors.get(key, "no result"), "traceback": ""})
+                continue
+            eval_out = evaluate_row(row, compact_result(serialize(results[key])))
+            metrics.add(eval_out["gold_errors"], eval_out["top5_predicted"], eval_out["hits"])
+            await results_writer.put(build_result_row(idx, row, eval_out))
+
+    metrics.write_summary(summary_path)
+    log(f"\n[metrics] {metrics.status_line()}")
+    log(f"Summary saved to: {os.path.abspath(summary_path)}")
+
+
+def dry_run(shard=None, rpm=None, tpm=None, concurrency=MAX_CONCURRENCY, call_latency=3.0):
+    """Render every agent prompt for every row and report token counts and projected run time; no model calls."""
+    from dry_run import DryRunReport, estimate_row
+
+    report = DryRunReport(PIPELINE_MODE)
+    seen = set()
+    for idx, row in iter_rows(CSV_PATH, READ_CHUNK_ROWS):
+        if not in_shard(idx, shard):
+            continue
+        if DEDUP_TRIPLES:
+            key = triple_key(row["Source"], row["Translation"], row["Reference"])
+            if key in seen:
+                report.duplicates += 1
+                continue
+            seen.add(key)
+        report.add(estimate_row(row["Source"], row["Translation"], row["Reference"], PIPELINE_MODE))
+
+    quota = {"rpm": rpm, "tpm": tpm, "concurrency": concurrency, "call_latency": call_latency}
+    log(report.format(**quota))
+
+    path = shard_path(mode_path(DRY_RUN_PATH), shard)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"quota": quota, **report.to_dict(**quota)}, f, indent=2, ensure_ascii=False)
+    log(f"Dry-run report saved to: {os.path.abspath(path)}")
+
+
+async def run_processes(count, max_concurrency, resume, adaptive):
+    """Run every shard of an i/count split as its own process on this machine, then merge."""
+    procs = []
+    for index in range(count):
+        args = [sys.executable, os.path.abspath(__file__), "--shard", f"{index}/{count}",
+                "--concurrency", str(max_concurrency)]
+        if not resume:
+            args.append("--no-resume")
+        if adaptive:
+            args.append("--adaptive")
+        args += ["--row-deadline", str(ROW_DEADLINE_SECONDS or 0), "--mode", PIPELINE_MODE,
+                 "--pack", str(PACK_SEGMENTS)]
+        if HEDGE:
+            args += ["--hedge", "--hedge-quantile", str(HEDGE_QUANTILE), "--hedge-max-extra", str(HEDGE_MAX_EXTRA)]
+        if CASCADE:
+            args += ["--cascade", "--cascade-backend", CASCADE_BACKEND, "--cascade-model", CASCADE_MODEL,
+                     "--cascade-band", f"{CASCADE_BAND[0]},{CASCADE_BAND[1]}",
+                     "--cascade-min-confidence", str(CASCADE_MIN_CONFIDENCE)]
+        procs.append(await asyncio.create_subprocess_exec(*args))
+
+    codes = await asyncio.gather(*(p.wait() for p in procs))
+    log(f"Shard processes exited with {codes}")
+    merge_shards(count, mode_path(OUTPUT_PATH), mode_path(FAILURE_PATH), mode_path(SUMMARY_PATH))
+    merge_ledgers([shard_path(mode_path(COST_LEDGER_PATH), (index, count)) for index in range(count)],
+                  mode_path(COST_LEDGER_PATH))
+
+
+def compare_modes():
+    """
+    Quality against throughput of each mode, side by side, both from the mode's summary. Throughput
+    is that of the last run of the mode that evaluated rows; calls/row includes calls answered by
+    the response cache, whose share is shown as cached.
+    """
+    lines = [f"{'mode':<10}{'rows':>7}{'hit@5':>8}{'recall@5':>10}{'prec@5':>8}{'calls/row':>11}{'cached':>8}"
+             f"{'rows/s':>9}"]
+    for mode in PIPELINE_MODES:
+        summary_path = mode_path(SUMMARY_PATH, mode)
+        if not os.path.exists(summary_path):
+            continue
+        with open(summary_path, encoding="utf-8") as f:
+            summary = json.load(f)
+        throughput = summary.get("throughput") or {}
+
+        def fmt(value, width, spec=".3f"):
+            return f"{value:>{width}{spec}}" if value is not None else f"{'n/a':>{width}}"
+
+        lines.append(
+            f"{mode:<10}{summary['rows_total']:>7}{fmt(summary['hit_at_5'], 8)}{fmt(summary['mean_recall_at_5'], 10)}"
+            f"{fmt(summary['mean_precision_at_5'], 8)}{fmt(throughput.get('calls_per_row'), 11, '.1f')}"
+            f"{fmt(throughput.get('cached_share'), 8, '.0%')}{fmt(throughput.get('rows_per_sec'), 9, '.2f')}"
+        )
+    log("\n".join(lines))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Top-5 error match evaluation on the IndicMT MQM data.")
+    parser.add_argument("--shard", type=parse_shard, default=None,
+                        help="evaluate only rows with row_id %% n == i, written to per-shard files (format i/n)")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="run n shards as local processes and merge them")
+    parser.add_argument("--merge", type=int, default=None, metavar="N",
+                        help="merge the per-shard outputs of an N-way sharded run and exit")
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY,
+                        help="rows in flight per process")
+    parser.add_argument("--adaptive", action="store_true", default=ADAPTIVE_CONCURRENCY,
+                        help="adjust rows in flight (AIMD) from latency and rate-limit signals, "
+                             "starting at --concurrency")
+    parser.add_argument("--row-deadline", type=float, default=ROW_DEADLINE_SECONDS,
+                        help="seconds a row may spend in the graph before it is cut off with a degraded result "
+                             "(0 disables)")
+    parser.add_argument("--mode", choices=PIPELINE_MODES, default=PIPELINE_MODE,
+                        help="full: one Stage-2 call per subtype (15); fused: one per super-category (4); "
+                             "express: a single call per row, no Stage-1/Stage-3 debate")
+    parser.add_argument("--pack", type=int, default=PACK_SEGMENTS, metavar="K",
+                        help="evaluate K rows per agent call (packed prompt, single-row fallback on a bad answer)")
+    parser.add_argument("--cascade", action="store_true",
+                        help="run agents on a cheap model first and escalate uncertain answers to the main model")
+    parser.add_argument("--cascade-backend", default=CASCADE_BACKEND, help="LLM backend of the cheap model")
+    parser.add_argument("--cascade-model", default=CASCADE_MODEL, help="cheap model name")
+    parser.add_argument("--cascade-band", default=f"{CASCADE_BAND[0]},{CASCADE_BAND[1]}", metavar="LOW,HIGH",
+                        help="escalate answers whose probability lies strictly between LOW and HIGH")
+    parser.add_argument("--cascade-min-confidence", type=float, default=CASCADE_MIN_CONFIDENCE,
+                        help="escalate answers whose confidence (0-100) is below this")
+    parser.add_argument("--hedge", action="store_true",
+                        help="send a duplicate of agent calls slower than --hedge-quantile of their stage's latency")
+    parser.add_argument("--hedge-quantile", type=float, default=HEDGE_QUANTILE,
+                        help="latency quantile after which a call is hedged")
+    parser.add_argument("--hedge-max-extra", type=float, default=HEDGE_MAX_EXTRA,
+                        help="cap on duplicate calls as a fraction of all calls")
+    parser.add_argument("--compare-modes", action="store_true",
+                        help="print quality and throughput of the finished runs of every mode and exit")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="render all prompts and report token counts and projected time without calling the model")
+    parser.add_argument("--rpm", type=int, default=int(os.getenv("OPENAI_RPM_LIMIT", "0") or 0),
+                        help="requests-per-minute quota for the dry-run projection")
+    parser.add_argument("--tpm", type=int, default=int(os.getenv("OPENAI_TPM_LIMIT", "0") or 0),
+                        help="tokens-per-minute quota for the dry-run projection")
+    parser.add_argument("--call-latency", type=float, default=3.0,
+                        help="assumed seconds per LLM call for the dry-run projection")
+    parser.add_argument("--queue", metavar="PATH", default=None,
+                        help="work as a job-queue worker on the SQLite queue at PATH (created and filled from the "
+                             "CSV if needed); start as many workers as wanted, on this host or machines sharing "
+                             "the file over a filesystem with working POSIX locks (e.g. NFSv4)")
+    parser.add_argument("--queue-export", action="store_true",
+                        help="with --queue, write the results, failures and summary from the queue and exit")
+    parser.add_argument("--worker-id", default=None,
+                        help="lease owner name for --queue (default host:pid)")
+    parser.add_argument("--batch", action="store_true",
+                        help="run the pipeline stage by stage through the OpenAI Batch API instead of live calls")
+    parser.add_argument("--batch-local", metavar="DIR", default=None,
+                        help="like --batch, but against the offline file-based stand-in in DIR")
+    parser.add_argument("--batch-dir", default=BATCH_WORKDIR,
+                        help="where batch request files and the manifest of submitted batches are kept")
+    parser.add_argument("--batch-poll", type=float, default=BATCH_POLL_SECONDS,
+                        help="seconds between batch status checks")
+    parser.add_argument("--no-resume", dest="resume", action="store_false",
+                        help="re-evaluate rows already present in the results file")
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    args = parse_args()
+    ROW_DEADLINE_SECONDS = args.row_deadline
+    PIPELINE_MODE = args.mode
+    app = build_app(PIPELINE_MODE)
+    PACK_SEGMENTS = args.pack
+    if PACK_SEGMENTS > 1:
+        from own_framework import structured_llm
+        from packing import SegmentPacker
+        chain_runner.packer = SegmentPacker(PACK_SEGMENTS, PACK_WAIT_SECONDS, structured_llm)
+    HEDGE = args.hedge
+    if HEDGE:
+        from hedging import RequestHedger
+        HEDGE_QUANTILE, HEDGE_MAX_EXTRA = args.hedge_quantile, args.hedge_max_extra
+        chain_runner.hedger = RequestHedger(HEDGE_QUANTILE, HEDGE_MAX_EXTRA)
+    CASCADE = args.cascade
+    if CASCADE:
+        if PACK_SEGMENTS > 1 or args.batch or args.batch_local:
+            sys.exit("--cascade works with live single-row calls only (not with --pack or --batch)")
+        from own_framework import structured_llm
+        from model_backends import make_llm
+        from cascade import ModelCascade
+        CASCADE_BACKEND, CASCADE_MODEL = args.cascade_backend, args.cascade_model
+        CASCADE_BAND = tuple(float(x) for x in args.cascade_band.split(","))
+        CASCADE_MIN_CONFIDENCE = args.cascade_min_confidence
+        chain_runner.cascade = ModelCascade(make_llm(CASCADE_BACKEND, CASCADE_MODEL),
+                                            lambda model, schema: structured_llm(schema, model),
+                                            CASCADE_BAND, CASCADE_MIN_CONFIDENCE)
+    if args.compare_modes:
+        compare_modes()
+    elif args.dry_run:
+        dry_run(args.shard, args.rpm, args.tpm, args.concurrency, args.call_latency)
+    elif args.batch or args.batch_local:
+        if args.batch_local:
+            from local_batch import LocalBatchClient
+            batch_client = LocalBatchClient(args.batch_local)
+        else:
+            from batch_runner import OpenAIBatchClient
+            batch_client = OpenAIBatchClient()
+        asyncio.run(batch_main(batch_client, args.shard, args.resume, args.batch_dir, args.batch_poll))
+    elif args.queue and args.queue_export:
+        export_queue(JobQueue(args.queue), mode_path(OUTPUT_PATH), mode_path(FAILURE_PATH), mode_path(SUMMARY_PATH),
+                     RESULT_COLUMNS)
+        merge_ledgers(sorted(glob.glob(worker_ledger_path("*"))), mode_path(COST_LEDGER_PATH))
+    elif args.queue:
+        asyncio.run(queue_worker(args.queue, args.concurrency, args.worker_id))
+    elif args.merge:
+        merge_shards(args.merge, mode_path(OUTPUT_PATH), mode_path(FAILURE_PATH), mode_path(SUMMARY_PATH))
+        merge_ledgers([shard_path(mode_path(COST_LEDGER_PATH), (index, args.merge)) for index in range(args.merge)],
+                      mode_path(COST_LEDGER_PATH))
+    elif args.processes:
+        asyncio.run(run_processes(args.processes, args.concurrency, args.resume, args.adaptive))
+    else:
+        asyncio.run(main(args.shard, args.concurrency, args.resume, args.adaptive))
\ No newline at end of file
@@ -0,0 +1,38 @@
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+# Per-message framing the chat format adds on top of the content (role, separators).
+MESSAGE_OVERHEAD_TOKENS = 4
+CHARS_PER_TOKEN = 4
+
+_encodings = {}
+
+
+def _encoding_for(model):
+    if tiktoken is None:
+        return None
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except Exception:
+            try:
+                _encodings[model] = tiktoken.get_encoding("o200k_base")
+            except Exception:
+                # no encoding files available offline; fall back to the character estimate
+                _encodings[model] = None
+    return _encodings[model]
+
+
+def count_tokens(text, model="gpt-4o-mini"):
+    """Token count of text for model, or a ~4 chars/token estimate when tiktoken is unavailable."""
+    encoding = _encoding_for(model)
+    if encoding is None:
+        return max(1, len(text) // CHARS_PER_TOKEN) if text else 0
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages, model="gpt-4o-mini"):
+    return sum(count_tokens(str(m.content), model) + MESSAGE_OVERHEAD_TOKENS for m in messages)